@@ -0,0 +1,246 @@
+"""
+Version history
+v1_0 = Throughput benchmarks for the quality scoring (s13), correlation (s15) and
+    annotator agreement (s5) pipelines on synthetic data of configurable size.
+"""
+
+import json
+import numpy as np
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import s5_annotator_agreement_v2_2 as s5
+import s13_review_quality_v2_2 as s13
+import s15_quality_correlation_stats_v1_1 as s15
+
+
+SUBJECTS = s5.SUBJECTS
+ML_KEYS = ["Feature Usage", "Interaction Time", "Context Experience", "Clarity of Sentiment", "Predicted Rating",
+           "Efficiency", "Excellence", "Status", "Esteem", "Play", "Aesthetics", "Ethics", "Spirituality"]
+FLAGS = ['Adverse Emotion', 'Ambiguous Value', 'Bot', 'Desc. not Aligned', 'Disingenuous', 'Extraneous',
+         'Format Problem', 'Missing Value', 'Unclear Value', 'Other', 'n/a']
+
+CONSUMER_VALUES = ["Efficiency", "Excellence", "Status", "Esteem", "Play", "Aesthetics", "Ethics", "Spirituality"]
+ASCRIPTIONS = ["Feature Usage", "Interaction Time", "Context Experience", "Clarity of Sentiment", "Predicted Rating"]
+NON_ASCRIPTIONS = ["reviewer_history", "verified", "image"]
+WEIGHTS = {"FUrev": 0.023912, "ITrev": 0.126529, "CErev": 0.849559, "ARrev": 0.761987, "IErev": 0.023478,
+           "Vrev": 0.214535, "CSrev": 0.195492, "PRrev": 0.804508}
+
+
+def synthetic_counts(rng, n_annotators, with_na=True):
+    """
+    Returns an annotation count dict over '1'..'5' (and 'n/a') for n_annotators votes.
+    """
+    labels = ['1', '2', '3', '4', '5'] + (['n/a'] if with_na else [])
+    counts = {label: 0 for label in labels}
+    for _ in range(n_annotators):
+        counts[rng.choice(labels)] += 1
+    return counts
+
+
+def synthetic_annotations(rng, n_annotators):
+    """
+    Returns one review's annotation counts for every subject, as in Summary_Annotations.
+    """
+    return {subject: synthetic_counts(rng, n_annotators, subject != "Clarity of Sentiment") for subject in SUBJECTS}
+
+
+def synthetic_review(rng, idx, n_products=1000, scored=False):
+    """
+    Returns one review shaped like the ML_datasets entries: summary_annotations counts
+    (with review flags), ML Ascription values (some NaN), reviewer_history and flags.
+    With scored=True both sources also carry random cq1/cq2/cq3/quality values.
+    """
+    n_annotators = rng.choice([1, 2, 3, 3, 3])
+    summary = synthetic_annotations(rng, n_annotators)
+    flags = {flag: 0 for flag in FLAGS}
+    for _ in range(n_annotators):
+        flags[rng.choice(FLAGS) if rng.random() < 0.1 else 'n/a'] += 1
+    summary["Review Flagged"] = flags
+
+    review = {
+        "reviewerID": f"R{idx}",
+        "unixReviewTime": 1400000000 + idx,
+        "asin": f"A{rng.randrange(n_products)}",
+        "overall": float(rng.randint(1, 5)),
+        "verified": rng.random() < 0.7,
+        "reviewer_history": [str(rng.randint(1, 5)) for _ in range(rng.randrange(8))],
+        "summary_annotations": summary,
+        "ML Ascription": {key: (float('nan') if rng.random() < 0.1 else rng.uniform(0, 5)) for key in ML_KEYS}
+    }
+    if rng.random() < 0.5:
+        review["image"] = ["image_url"]
+    if scored:
+        for source in ["summary_annotations", "ML Ascription"]:
+            cqs = [rng.uniform(0, 5) for _ in range(3)]
+            review[source].update({"cq1": cqs[0], "cq2": cqs[1], "cq3": cqs[2], "quality": min(cqs)})
+    return review
+
+
+def generate_ml_datasets(data_dir, n_categories, reviews_per_category, seed=0, scored=False):
+    """
+    Writes n_categories synthetic <category>_extended.json files to data_dir.
+    """
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    for category in range(n_categories):
+        start = category * reviews_per_category
+        reviews = [synthetic_review(rng, start + idx, scored=scored) for idx in range(reviews_per_category)]
+        with open(os.path.join(data_dir, f"Category_{category}_extended.json"), 'w', encoding='utf-8') as f:
+            json.dump(reviews, f, indent=4)
+
+
+def generate_summary_annotations(annotations_dir, n_files, reviews_per_file, seed=0):
+    """
+    Writes n_files synthetic Summary_Annotations files (review index -> subject counts)
+    to annotations_dir, with mostly three annotators per review.
+    """
+    rng = random.Random(seed)
+    os.makedirs(annotations_dir, exist_ok=True)
+    for file_idx in range(n_files):
+        annotations = {str(idx): synthetic_annotations(rng, rng.choice([2, 3, 3, 3, 3, 4]))
+                       for idx in range(reviews_per_file)}
+        with open(os.path.join(annotations_dir, f"Category_{file_idx}.json"), 'w', encoding='utf-8') as f:
+            json.dump(annotations, f, indent=4)
+
+
+def time_stage(name, n_items, func, *args, measure_memory=True):
+    """
+    Runs func(*args) and returns a result dict with its wall time and items per second.
+    If measure_memory is True the stage is then run a second time under tracemalloc,
+    with the peak reset beforehand, and its peak traced allocation is reported. The
+    untraced run gives the timing, since tracing slows allocation-heavy code.
+    """
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    
+    peak_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func(*args)
+        peak_mb = (tracemalloc.get_traced_memory()[1] - baseline) / (1024 * 1024)
+        tracemalloc.stop()
+    return {
+        "stage": name,
+        "items": n_items,
+        "seconds": elapsed,
+        "items_per_second": n_items / elapsed if elapsed > 0 else None,
+        "peak_alloc_mb": peak_mb
+    }
+
+
+def bench_scoring(review_data):
+    # Per-review path: process_review then compute_quality
+    for review in review_data:
+        entry = s13.process_review(review, CONSUMER_VALUES, ASCRIPTIONS, NON_ASCRIPTIONS, "summary_annotations")
+        if entry is not None:
+            s13.compute_quality(entry, WEIGHTS)
+
+
+def bench_batch_scoring(review_data):
+    features, valid, _ = s13.build_feature_matrix(review_data, CONSUMER_VALUES, ASCRIPTIONS, NON_ASCRIPTIONS,
+                                                  "summary_annotations")
+    s13.compute_quality_batch(features[valid], WEIGHTS)
+
+
+def check_batch_scoring(review_data):
+    """
+    Checks that batch scoring gives exactly the review IDs and scores of the per-review
+    path for both data sources. Raises AssertionError on any difference.
+    """
+    for source in ["summary_annotations", "ML Ascription"]:
+        per_review = [values[1:] for values in s13.score_reviews(review_data, CONSUMER_VALUES, ASCRIPTIONS, 
+                                                                  NON_ASCRIPTIONS, WEIGHTS, source, batch=False)]
+        batch = [values[1:] for values in s13.score_reviews(review_data, CONSUMER_VALUES, ASCRIPTIONS, 
+                                                             NON_ASCRIPTIONS, WEIGHTS, source, batch=True)]
+        assert batch == per_review, f"Batch and per-review scores differ for {source}"
+
+
+def bench_correlations(data_dir):
+    pairs = s15.gather_pairs(data_dir, "summary_annotations", "ML Ascription")
+    s15.compute_correlations(pairs)
+    s15.compute_spearman(pairs)
+
+
+def bench_agreement(annotations):
+    binary_matrices = []
+    ordinal_matrices = []
+    for annotator_data in annotations.values():
+        binary_matrix, _ = s5.prepare_binary_matrix(annotator_data)
+        ordinal_matrix, _ = s5.prepare_ordinal_matrix(annotator_data)
+        if binary_matrix.size > 0:
+            binary_matrices.append(binary_matrix)
+        if len(ordinal_matrix) > 0:
+            ordinal_matrices.extend(ordinal_matrix)
+    s5.fleiss_kappa_components(np.vstack(binary_matrices))
+    s5.fleiss_kappa_components(np.vstack(ordinal_matrices))
+    s5.calculate_weighted_kappa(ordinal_matrices)
+
+
+def print_results(results):
+    header = f"{'Stage':<32}  {'Items':>10}  {'Seconds':>9}  {'Items/s':>12}  {'Peak alloc (MB)':>15}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        rate = "N/A" if result["items_per_second"] is None else f"{result['items_per_second']:.1f}"
+        peak = "N/A" if result["peak_alloc_mb"] is None else f"{result['peak_alloc_mb']:.1f}"
+        print(f"{result['stage']:<32}  {result['items']:>10}  {result['seconds']:>9.3f}  {rate:>12}  {peak:>15}")
+
+
+def main(n_categories=4, reviews_per_category=5000, n_annotation_files=4, reviews_per_file=5000, seed=0,
+         output_path=None, measure_memory=True):
+    """
+    Generates synthetic data in a temporary directory, times each pipeline stage and
+    prints reviews (or annotated reviews) per second, after checking that batch scoring
+    matches per-review scoring exactly. With measure_memory each stage also reports
+    the peak memory it allocated itself, measured by tracemalloc in a separate run of
+    the stage, so stages can be compared with each other.
+    If output_path is given the results are also saved there as JSON, as a baseline
+    for catching performance regressions.
+    """
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        data_dir = os.path.join(work_dir, "ML_datasets")
+        annotations_dir = os.path.join(work_dir, "Summary_Annotations")
+        generate_ml_datasets(data_dir, n_categories, reviews_per_category, seed, scored=True)
+        generate_summary_annotations(annotations_dir, n_annotation_files, reviews_per_file, seed)
+
+        review_data = []
+        for file_name in sorted(os.listdir(data_dir)):
+            with open(os.path.join(data_dir, file_name), 'r', encoding='utf-8') as f:
+                review_data.extend(json.load(f))
+        annotations = s5.load_annotations(annotations_dir)
+        n_reviews = len(review_data)
+        n_annotated = sum(len(annotator_data) for annotator_data in annotations.values())
+        check_batch_scoring(review_data)
+
+        results = [
+            time_stage("s13 process_review + quality", n_reviews, bench_scoring, review_data,
+                       measure_memory=measure_memory),
+            time_stage("s13 batch feature matrix + CQs", n_reviews, bench_batch_scoring, review_data,
+                       measure_memory=measure_memory),
+            time_stage("s15 gather_pairs + correlations", n_reviews, bench_correlations, data_dir,
+                       measure_memory=measure_memory),
+            time_stage("s5 matrices + kappas", n_annotated, bench_agreement, annotations,
+                       measure_memory=measure_memory)
+        ]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    if output_path is not None:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nBenchmark results saved to: {output_path}")
+    return results
+
+
+if __name__ == "__main__":
+    main(output_path="benchmark_results.json")
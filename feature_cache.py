@@ -0,0 +1,120 @@
+"""
+Version history
+v1_0 = Persistent columnar cache of the numeric fields extracted from the large JSON
+    files, stored as one .npy file per column and loaded memory-mapped.
+"""
+
+import hashlib
+import json
+import numpy as np
+import os
+import shutil
+
+
+CACHE_DIR = '.feature_cache'
+
+
+def file_signature(file_path):
+    """
+    Returns the path, size and modification time (ns) identifying file_path.
+    """
+    stat = os.stat(file_path)
+    return {"path": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def file_hash(file_path, block_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of the contents of file_path.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_entry_dir(source_path, namespace, cache_dir=CACHE_DIR):
+    """
+    Returns the directory holding the cached columns of source_path for namespace.
+    """
+    path_key = hashlib.sha1(os.path.abspath(source_path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, namespace, path_key)
+
+
+def read_manifest(entry_dir):
+    manifest_path = os.path.join(entry_dir, 'manifest.json')
+    if not os.path.isfile(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return None
+
+
+def write_manifest(entry_dir, manifest):
+    # Written last and renamed into place, so a manifest only ever describes complete columns
+    manifest_path = os.path.join(entry_dir, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def validate_manifest(manifest, source_path):
+    """
+    Checks a manifest against the current state of source_path. A matching size and
+    mtime is trusted as is; otherwise the content hash decides, so a file that was
+    only touched keeps its cache. Returns the (possibly refreshed) manifest, or None
+    if the source has changed and the cached columns are stale.
+    """
+    if manifest is None:
+        return None
+    signature = file_signature(source_path)
+    cached = manifest["source"]
+    if cached["path"] != signature["path"] or cached["size"] != signature["size"]:
+        return None
+    if cached["mtime_ns"] == signature["mtime_ns"]:
+        return manifest
+    if cached["sha256"] != file_hash(source_path):
+        return None
+    cached["mtime_ns"] = signature["mtime_ns"]
+    return manifest
+
+
+def load_columns(source_path, columns, extractor, namespace, cache_dir=CACHE_DIR):
+    """
+    Returns a dict mapping each name in columns to a read-only memory-mapped array
+    for source_path. Columns are read from the cache when it is still valid for
+    the file's path, size, mtime and content hash. Otherwise extractor(source_path,
+    missing_columns) is called; it must return a dict of column name -> NumPy array
+    (non-object dtype) containing at least the missing columns, and the result is
+    saved to the cache. A changed source file discards all of its cached columns.
+    namespace separates the caches of different extractors.
+    """
+    entry_dir = cache_entry_dir(source_path, namespace, cache_dir)
+    stored = read_manifest(entry_dir)
+    stored_mtime = stored["source"]["mtime_ns"] if stored is not None else None
+    manifest = validate_manifest(stored, source_path)
+    if manifest is None:
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir)
+        signature = file_signature(source_path)
+        signature["sha256"] = file_hash(source_path)
+        manifest = {"source": signature, "columns": {}}
+
+    missing = [column for column in columns if column not in manifest["columns"]]
+    if missing:
+        extracted = extractor(source_path, missing)
+        os.makedirs(entry_dir, exist_ok=True)
+        for column, values in extracted.items():
+            # Columns already cached may be memory-mapped elsewhere, so they are never rewritten
+            if column in manifest["columns"]:
+                continue
+            file_name = f"col_{len(manifest['columns'])}.npy"
+            np.save(os.path.join(entry_dir, file_name), np.asarray(values), allow_pickle=False)
+            manifest["columns"][column] = file_name
+    if missing or manifest["source"]["mtime_ns"] != stored_mtime:
+        write_manifest(entry_dir, manifest)
+
+    return {column: np.load(os.path.join(entry_dir, manifest["columns"][column]), mmap_mode='r')
+            for column in columns}
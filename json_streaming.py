@@ -0,0 +1,122 @@
+"""
+Version history
+v1_0 = Incremental reading and writing of the JSON review arrays in ML_datasets, so
+    that a category file never has to be held in memory as a whole.
+"""
+
+import json
+import os
+import re
+
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json_array(file_path, chunk_size=1 << 20):
+    """
+    Yields the elements of the top-level JSON array in file_path one at a time,
+    reading the file in chunks of chunk_size characters. Only the element being
+    decoded (plus at most one chunk) is held in memory. Raises json.JSONDecodeError
+    for malformed JSON, including anything but whitespace after the array (as
+    json.load does), and TypeError if the top-level value is not an array.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def fill(buffer, pos):
+            # Drop the consumed prefix before appending the next chunk
+            chunk = f.read(chunk_size)
+            return buffer[pos:] + chunk, 0, not chunk
+
+        def skip_whitespace(buffer, pos, eof):
+            pos = WHITESPACE.match(buffer, pos).end()
+            while pos == len(buffer) and not eof:
+                buffer, pos, eof = fill(buffer, pos)
+                pos = WHITESPACE.match(buffer, pos).end()
+            return buffer, pos, eof
+
+        def check_end(buffer, pos, eof):
+            # The array must be the whole document, so only whitespace may follow it
+            buffer, pos, eof = skip_whitespace(buffer, pos, eof)
+            if pos < len(buffer):
+                raise json.JSONDecodeError("Extra data", buffer, pos)
+
+        buffer, pos, eof = skip_whitespace(buffer, pos, eof)
+        if pos == len(buffer):
+            raise json.JSONDecodeError("Expecting value", buffer, pos)
+        if buffer[pos] != '[':
+            raise TypeError(f"Expected a JSON array in '{file_path}'")
+        pos += 1
+
+        buffer, pos, eof = skip_whitespace(buffer, pos, eof)
+        if buffer[pos:pos + 1] == ']':
+            check_end(buffer, pos + 1, eof)
+            return
+
+        while True:
+            # Decode the next element, reading more of the file while it is incomplete.
+            # A truncated number (e.g. "1.5e" of "1.5e10") still decodes, so an element
+            # is only accepted once its following delimiter is in the buffer.
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    delimiter = WHITESPACE.match(buffer, end).end()
+                    if buffer[delimiter:delimiter + 1] in (',', ']') or eof:
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                buffer, pos, eof = fill(buffer, pos)
+            yield item
+            pos = end
+
+            buffer, pos, eof = skip_whitespace(buffer, pos, eof)
+            if pos == len(buffer):
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            if buffer[pos] == ']':
+                check_end(buffer, pos + 1, eof)
+                return
+            if buffer[pos] != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            buffer, pos, eof = skip_whitespace(buffer, pos + 1, eof)
+
+            # Keep the buffer bounded by discarding everything already decoded
+            if pos > chunk_size:
+                buffer, pos = buffer[pos:], 0
+
+
+def write_json_array(file_path, items, indent=4, ensure_ascii=False, replace_if=None):
+    """
+    Writes the iterable items to file_path as a JSON array, one element at a time.
+    The output is identical to json.dump(list(items), f, indent=indent,
+    ensure_ascii=ensure_ascii). The array is written to a temporary file that
+    replaces file_path only once every element has been written, so items may be
+    streamed from file_path itself and a failure leaves the original untouched.
+    If replace_if is given it is called once every element has been written, and the
+    temporary file is discarded instead if it returns False.
+    Returns the number of elements written.
+    """
+    temp_path = file_path + '.tmp'
+    encoder = json.JSONEncoder(indent=indent, ensure_ascii=ensure_ascii)
+    item_indent = '\n' + ' ' * indent
+    count = 0
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for item in items:
+                f.write('[' + item_indent if count == 0 else ',' + item_indent)
+                # JSON strings cannot contain raw newlines, so this only re-indents the layout
+                f.write(encoder.encode(item).replace('\n', item_indent))
+                count += 1
+            f.write('[]' if count == 0 else '\n]')
+        if replace_if is None or replace_if():
+            os.replace(temp_path, file_path)
+        else:
+            os.remove(temp_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return count
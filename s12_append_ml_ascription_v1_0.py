@@ -1,11 +1,28 @@
 """
 Version history
-v1_0 = Adds ML CQ features ascription outputs to ML datasets.
+v1_0 = Adds ML CQ features ascription outputs to ML datasets. Optionally reads the
+    predictions CSV in chunks within a memory budget. Categories can be merged in a
+    process pool, also within that budget, each file is replaced atomically, and
+    categories whose predictions and JSON are unchanged since their last merge are
+    skipped.
 """
 
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import hashlib
 import os
 import json
 import pandas as pd
+import shutil
+import tempfile
+from feature_cache import CACHE_DIR, file_hash, file_signature, validate_manifest
+from json_streaming import write_json_array
+
+
+# Columns that identify a prediction row and its category
+ID_COLUMNS = ['category', 'reviewerID', 'unixReviewTime']
+# Peak memory of merge_category as a multiple of the category JSON's file size: the
+# file is parsed whole and then serialized again
+MERGE_MEMORY_FACTOR = 3
 
 
 # Helper to add unique_id to each JSON object
@@ -20,40 +37,238 @@ def add_unique_id_to_data(data):
         obj['unique_id'] = f"{reviewer}_{unixtime}"
 
 
-def main(datasets_dir, df, ml_keys):
-    for category, group in df.groupby('category'):
+def ml_ascription_table(group, ml_keys):
+    """
+    Returns the ml_keys columns of the prediction rows in group as a DataFrame indexed
+    by unique_id (reviewerID + unixReviewTime), in ml_keys order with None for keys
+    missing from the CSV. When an id is repeated the last row is kept, as it would
+    have been applied last.
+    """
+    unique_ids = group['reviewerID'].astype(str) + "_" + group['unixReviewTime'].astype(str)
+    table = group.reindex(columns=ml_keys).astype(object)
+    table[[key for key in ml_keys if key not in group.columns]] = None
+    table.index = pd.Index(unique_ids, name='unique_id')
+    return table[~table.index.duplicated(keep='last')]
+
+
+def merge_category(json_file, group, ml_keys):
+    """
+    Adds the ML Ascription scores of one category's prediction rows to the reviews in
+    json_file and writes it back through a temporary file, so an interrupted write
+    leaves the original intact. Returns the signature (path, size, mtime and SHA-256)
+    of the written file.
+    """
+    # Load JSON array
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+        
+    # Inject unique_id into every object
+    add_unique_id_to_data(data)
+           
+    # Build a map from unique_id to object
+    lookup = { item.get('unique_id'): item for item in data }
+    
+    # Join the prediction rows to the reviews on unique_id in bulk
+    table = ml_ascription_table(group, ml_keys)
+    found = table.index.isin(list(lookup))
+    missing = table.index[~found]
+    if len(missing) > 0:
+        examples = ", ".join(missing[:5])
+        print(f"{len(missing)} unique_ids not found in {json_file} (e.g. {examples})")
+    
+    # Insert or update under "ML Ascription"
+    matched = table[found]
+    for uid, values in zip(matched.index, matched.to_numpy().tolist()):
+        lookup[uid].setdefault('ML Ascription', {}).update(zip(ml_keys, values))
+           
+    # Write back the updated JSON, renamed into place once complete
+    write_json_array(json_file, data, indent=2, ensure_ascii=False)
+    signature = file_signature(json_file)
+    signature["sha256"] = file_hash(json_file)
+    return signature
+
+
+def merge_footprint(json_file, group):
+    """
+    Returns the estimated peak memory in bytes of merging group into json_file in a
+    worker: the parsed JSON plus the worker's copy of the prediction rows.
+    """
+    return MERGE_MEMORY_FACTOR * os.path.getsize(json_file) + int(group.memory_usage(deep=True).sum())
+
+
+def slice_digest(group, ml_keys):
+    """
+    Returns a digest of the ML Ascription values that group would write, keyed by
+    unique_id and in ml_keys order.
+    """
+    table = ml_ascription_table(group, ml_keys)
+    digest = hashlib.sha256(json.dumps(ml_keys).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(table).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def load_merge_state(state_path):
+    """
+    Returns the merge state saved at state_path (JSON file path -> the slice digest
+    merged into it and the file's signature after the merge), or an empty dict.
+    """
+    if state_path is None or not os.path.isfile(state_path):
+        return {}
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        print(f"Ignoring unreadable merge state: {state_path}")
+        return {}
+
+
+def save_merge_state(state_path, state):
+    # Renamed into place, so the state file is never left half written
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    with open(state_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=4)
+    os.replace(state_path + '.tmp', state_path)
+
+
+def is_merged(state, json_file, digest):
+    """
+    Returns True if the slice with this digest was the last one merged into json_file
+    and the file is unchanged since. As for the feature cache, a matching size and
+    mtime is trusted, and otherwise the content hash decides.
+    """
+    entry = state.get(os.path.abspath(json_file))
+    if entry is None or entry["slice"] != digest:
+        return False
+    return validate_manifest(entry, json_file) is not None
+
+
+def category_jobs(datasets_dir, category_groups, ml_keys, state):
+    """
+    Yields (json_file, group, digest) for each category whose _extended.json exists
+    and still needs this merge.
+    """
+    for category, group in category_groups:
         aligned_category = category.replace(" ", "_")
         json_file = os.path.join(datasets_dir, f"{aligned_category}_extended.json")
         if not os.path.isfile(json_file):
             print(f"File not found: {json_file}")
             continue
-               
-        # Load JSON array
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        # Inject unique_id into every object
-        add_unique_id_to_data(data)
-               
-        # Build a map from unique_id to object
-        lookup = { item.get('unique_id'): item for item in data }
-               
-        # Iterate rows in this category
-        for _, row in group.iterrows():
-            uid = f"{row['reviewerID']}_{row['unixReviewTime']}"
-            obj = lookup.get(uid)
-            if obj is None:
-                print(f"unique_id {uid} not found in {json_file}")
-                continue
-               
-            # Build the nested ML Ascription dict from the row
-            ml_block = { key: row.get(key) for key in ml_keys }
-            # Insert or update under "ML Ascription"
-            obj.setdefault('ML Ascription', {}).update(ml_block)
-               
-        # Write back the updated JSON
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        
+        digest = slice_digest(group, ml_keys)
+        if is_merged(state, json_file, digest):
+            print(f"Unchanged since last merge, skipping: {json_file}")
+            continue
+        yield json_file, group, digest
+
+
+def spill_buffers(buffers, spill_dir, spill_parts):
+    """
+    Writes each category's buffered chunks to a new part file in spill_dir and
+    empties the buffers. spill_parts maps each category to its part files, in order.
+    """
+    for category, frames in buffers.items():
+        if not frames:
+            continue
+        category_dir = os.path.join(spill_dir, f"category_{list(spill_parts).index(category)}")
+        os.makedirs(category_dir, exist_ok=True)
+        part_path = os.path.join(category_dir, f"part_{len(spill_parts[category])}.pkl")
+        pd.concat(frames).to_pickle(part_path)
+        spill_parts[category].append(part_path)
+        frames.clear()
+
+
+def read_category_groups(csv_path, ml_keys, chunk_size=100000, memory_budget_mb=512, score_dtype='float32'):
+    """
+    Reads the predictions CSV in chunks of chunk_size rows and yields (category, group)
+    in sorted category order, as df.groupby('category') would, with each group's rows
+    in file order. Only the ID_COLUMNS and the ml_keys present are read, with string
+    ids, a categorical category and score_dtype scores. Rows are routed to per-category
+    buffers, and all buffers are spilled to temporary files whenever they exceed
+    memory_budget_mb, so at most one chunk, the buffers and the group being yielded
+    are held in memory. Scores are returned as float64 with the shortest decimal
+    representation of their score_dtype value.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    score_columns = [key for key in ml_keys if key in header]
+    dtype = {'category': 'category', 'reviewerID': str, 'unixReviewTime': str}
+    dtype.update({key: score_dtype for key in score_columns})
+    
+    budget = memory_budget_mb * 1024 * 1024
+    buffers = {}
+    spill_parts = {}
+    buffered = 0
+    spill_dir = tempfile.mkdtemp(prefix='s12_spill_')
+    try:
+        for chunk in pd.read_csv(csv_path, usecols=ID_COLUMNS + score_columns, dtype=dtype, chunksize=chunk_size):
+            for category, group in chunk.groupby('category', observed=True):
+                buffers.setdefault(category, []).append(group)
+                spill_parts.setdefault(category, [])
+                buffered += group.memory_usage(deep=True).sum()
+            if buffered > budget:
+                spill_buffers(buffers, spill_dir, spill_parts)
+                buffered = 0
+        
+        for category in sorted(spill_parts):
+            frames = [pd.read_pickle(part_path) for part_path in spill_parts[category]] + buffers.pop(category)
+            group = pd.concat(frames)
+            # Categories differ between chunks, so the column is restored to plain strings
+            group['category'] = group['category'].astype(str)
+            group[score_columns] = group[score_columns].astype(str).astype(float)
+            yield category, group
+            for part_path in spill_parts[category]:
+                os.remove(part_path)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def main(datasets_dir, df, ml_keys, workers=1, state_path=None, memory_budget_mb=None):
+    """
+    Adds the ML Ascription scores to every category's _extended.json file in
+    datasets_dir, opening each file once. df is the predictions DataFrame, or an
+    iterable of (category, group) pairs such as read_category_groups yields.
+    With workers > 1 categories are merged in a process pool, with at most workers
+    categories in flight so that streamed groups are not all read ahead. If
+    memory_budget_mb is given, a category is also held back until the estimated
+    footprints (see merge_footprint) of the merges in flight fit within it, though
+    a category that exceeds the budget on its own still runs, alone. If
+    state_path is given, categories whose predictions and JSON file are unchanged
+    since their last merge are skipped, and the state is saved there afterwards
+    (also after a failure, for the categories that completed).
+    """
+    category_groups = df.groupby('category') if isinstance(df, pd.DataFrame) else df
+    state = load_merge_state(state_path)
+    jobs = category_jobs(datasets_dir, category_groups, ml_keys, state)
+    
+    def record(json_file, digest, signature):
+        state[os.path.abspath(json_file)] = {"source": signature, "slice": digest}
+    
+    try:
+        if workers > 1:
+            budget = None if memory_budget_mb is None else memory_budget_mb * 1024 * 1024
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                running = {}
+                in_flight = 0
+                for json_file, group, digest in jobs:
+                    footprint = merge_footprint(json_file, group) if budget is not None else 0
+                    while running and (len(running) >= workers or 
+                                       (budget is not None and in_flight + footprint > budget)):
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            done_file, done_digest, done_footprint = running.pop(future)
+                            in_flight -= done_footprint
+                            record(done_file, done_digest, future.result())
+                    future = executor.submit(merge_category, json_file, group, ml_keys)
+                    running[future] = (json_file, digest, footprint)
+                    in_flight += footprint
+                for future in wait(running).done:
+                    done_file, done_digest, _ = running[future]
+                    record(done_file, done_digest, future.result())
+        else:
+            for json_file, group, digest in jobs:
+                record(json_file, digest, merge_category(json_file, group, ml_keys))
+    finally:
+        if state_path is not None:
+            save_merge_state(state_path, state)
                
     print("Done updating all JSON files.")
 
@@ -64,9 +279,22 @@ if __name__ == "__main__":
     ml_output_dir = 'ML_ascription_outputs'
     datasets_dir = 'ML_datasets'
     
+    # Read the CSV in chunks within a memory budget, rather than as one DataFrame
+    stream           = True
+    chunk_size       = 100000  # Rows per chunk
+    memory_budget_mb = 512  # Buffered rows beyond this are spilled to disk
+    
+    # Categories merged concurrently, and the record of completed merges (kept outside
+    # ML_datasets) used to skip unchanged categories on the next run. Each worker parses
+    # a whole category JSON, so when streaming, the merges in flight are also kept
+    # within memory_budget_mb (estimated at MERGE_MEMORY_FACTOR x each JSON's size):
+    # extra workers only run while their categories fit, and peak memory stays near
+    # twice the budget (buffered rows plus merges) whatever the number of workers.
+    workers          = os.cpu_count() or 1
+    state_path       = os.path.join(CACHE_DIR, 's12_merge_state.json')
+    
     # Load the Excel file
     csv_path = os.path.join(ml_output_dir, 'ML_Predictions_Feature_Scores_Full_Set.csv')
-    df = pd.read_csv(csv_path)
     
     # Define the ML Ascription fields you want to copy
     ml_keys = [
@@ -75,5 +303,10 @@ if __name__ == "__main__":
         "Aesthetics", "Ethics", "Spirituality"
     ]
     
+    if stream:
+        df = read_category_groups(csv_path, ml_keys, chunk_size, memory_budget_mb)
+    else:
+        df = pd.read_csv(csv_path)
+    
     # For each category, open its JSON once, update all rows, then save
-    main(datasets_dir, df, ml_keys)
+    main(datasets_dir, df, ml_keys, workers, state_path, memory_budget_mb if stream else None)
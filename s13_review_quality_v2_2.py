@@ -9,10 +9,52 @@ v1_1 = Filters to remove potentially duplicitous reviews
 v1_0 = Implements CQ equations with prior weights from Decision Tree Analysis.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import functools
+import hashlib
+import heapq
+from itertools import repeat
 import json
+import marshal
 import math
+from operator import itemgetter
 import matplotlib.pyplot as plt
+import numpy as np
 import os
+from scipy.stats import rankdata
+import time
+from feature_cache import CACHE_DIR, load_columns
+from json_streaming import iter_json_array, write_json_array
+
+
+# Column order of the batch feature matrix, and the processed-entry field behind each column.
+FEATURE_KEYS = ["FUrev", "ITrev", "CErev", "ARrev", "IErev", "Vrev", "CSrev", "PRrev"]
+FEATURE_FIELDS = {
+        "FUrev": "Feature Usage",
+        "ITrev": "Interaction Time",
+        "CErev": "Context Experience",
+        "ARrev": "Author Rating",
+        "IErev": "Image Exists",
+        "Vrev": "Verified",
+        "CSrev": "Clarity of Sentiment",
+        "PRrev": "Product Rating"
+}
+# Features combined by each of CQ1, CQ2 and CQ3.
+CQ_FEATURE_SETS = [["FUrev", "ITrev", "CErev"], ["ARrev", "IErev", "Vrev"], ["CSrev", "PRrev"]]
+# Scores attached under each data source, and the fingerprint of the inputs they were computed from.
+SCORE_KEYS = ["cq1", "cq2", "cq3", "quality"]
+FINGERPRINT_KEY = "cq_fingerprint"
+# Review flags that exclude a review from scoring.
+DECEPTION_FLAGS = ["Bot", "Desc. not Aligned", "Disingenuous"]
+# Counters for the reasons a review is dropped, in the column order of drop_reason_matrix.
+DROP_REASONS = ["missing_data_source", "dropped_num_annotators"] + [f"dropped_flag_{label}" for label in DECEPTION_FLAGS]
+# Labels of the summary_annotations counts, scored 1 to 5 with "n/a" (last) as 0.
+ANNOTATION_LABELS = ["1", "2", "3", "4", "5", "n/a"]
+# Upper bound on the (reviews x weight vectors) quality values computed at once by
+# the weight sweep. Each block allocates a small multiple of this (the three CQs,
+# ranks and partition indices), so it bounds the sweep's memory whatever the corpus size.
+SWEEP_BLOCK_ELEMENTS = 1 << 22
 
 
 def ascription_scoring(review, ascription_feature, processed, data_source):
@@ -81,26 +123,174 @@ def compute_CQ(entry, w, features, feature_set):
 
 def compute_quality(entry, w):
 
-    features = {
-            "FUrev": entry["Feature Usage"],
-            "ITrev": entry["Interaction Time"],
-            "CErev": entry["Context Experience"],
-            "ARrev": entry["Author Rating"],
-            "IErev": entry["Image Exists"],
-            "Vrev": entry["Verified"],
-            "CSrev": entry["Clarity of Sentiment"],
-            "PRrev": entry["Product Rating"]
-    }
+    features = {key: entry[field] for key, field in FEATURE_FIELDS.items()}
     
     # Compute CQ1, CQ2, and CQ3:
-    cq1 = compute_CQ(entry, w, features, ["FUrev", "ITrev", "CErev"])
-    cq2 = compute_CQ(entry, w, features, ["ARrev", "IErev", "Vrev"])
-    cq3 = compute_CQ(entry, w, features, ["CSrev", "PRrev"])
+    cq1 = compute_CQ(entry, w, features, CQ_FEATURE_SETS[0])
+    cq2 = compute_CQ(entry, w, features, CQ_FEATURE_SETS[1])
+    cq3 = compute_CQ(entry, w, features, CQ_FEATURE_SETS[2])
     
     quality = min(cq1, cq2, cq3)
     return cq1, cq2, cq3, quality
 
 
+def compute_quality_batch(features, w):
+    """
+    Batch equivalent of compute_quality. Takes an (n_reviews x 8) feature matrix with
+    columns ordered as FEATURE_KEYS and returns arrays (cq1, cq2, cq3, quality).
+    The weight sums are checked once per call rather than once per review, and each
+    weighted column is accumulated in the same order as compute_CQ so that the
+    results are bit-for-bit identical to the per-review path.
+    """
+    features = np.asarray(features, dtype=float)
+    cqs = []
+    for feature_set in CQ_FEATURE_SETS:
+        denominator = 0
+        for feature in feature_set:
+            denominator += w[feature]
+        if denominator != 1.0:
+            raise ValueError("Sum of weights should be equal to 1.0")
+
+        numerator = np.zeros(features.shape[0])
+        for feature in feature_set:
+            numerator += w[feature] * features[:, FEATURE_KEYS.index(feature)]
+        cqs.append(numerator / denominator)
+
+    cq1, cq2, cq3 = cqs
+    quality = np.minimum(np.minimum(cq1, cq2), cq3)
+    return cq1, cq2, cq3, quality
+
+
+def label_counts(block):
+    """
+    Returns the counts of one summary_annotations count dict in ANNOTATION_LABELS order,
+    with 0 for missing labels. Raises ValueError for any other label.
+    """
+    unexpected = set(block) - set(ANNOTATION_LABELS)
+    if unexpected:
+        raise ValueError(f"Unexpected annotation labels {sorted(unexpected)}, expected {ANNOTATION_LABELS}")
+    return tuple(block.get(label, 0) for label in ANNOTATION_LABELS)
+
+
+def annotation_means(blocks, include_na):
+    """
+    Batch equivalent of the summary_annotations branch of ascription_scoring: returns
+    the mean label of each count dict in blocks, with "n/a" counted as 0 (or left out
+    if not include_na) and 0 where there are no counts. The counts are whole numbers,
+    so the sums are exact and the means identical to the per-review path.
+    """
+    # Dicts holding every label, or every label but "n/a" (the usual cases), are read in one call
+    all_counts = itemgetter(*ANNOTATION_LABELS)
+    scored_counts = itemgetter(*ANNOTATION_LABELS[:-1])
+    try:
+        rows = [all_counts(block) if len(block) == len(ANNOTATION_LABELS) 
+                else scored_counts(block) + (0,) if len(block) == len(ANNOTATION_LABELS) - 1 
+                else label_counts(block) for block in blocks]
+    except KeyError:
+        # Some dict holds other labels than assumed from its size, so each is read label by label
+        rows = [label_counts(block) for block in blocks]
+    counts = np.array(rows, dtype=float).reshape(len(blocks), len(ANNOTATION_LABELS))
+    
+    weighted = counts[:, :-1] @ np.arange(1.0, len(ANNOTATION_LABELS))
+    totals = counts.sum(axis=1) if include_na else counts[:, :-1].sum(axis=1)
+    means = np.zeros(len(blocks))
+    np.divide(weighted, totals, out=means, where=totals > 0)
+    return means
+
+
+def ml_values(blocks, feature):
+    """
+    Batch equivalent of the ML Ascription branch of ascription_scoring: returns the
+    feature's value in each ML Ascription block, with missing (None) and NaN values
+    set to 0.
+    """
+    # NumPy converts None to NaN in a float array
+    values = np.array([block[feature] for block in blocks], dtype=float)
+    values[np.isnan(values)] = 0.0
+    return values
+
+
+def history_scores(reviews):
+    """
+    Batch equivalent of the reviewer_history branch of process_review: returns each
+    review's Author Rating, (min(mean vote, 5) + min(number of votes, 5)) / 2, or 0
+    without a history. A history with a non-integer vote counts as all zeros.
+    """
+    sums = np.zeros(len(reviews))
+    lengths = np.zeros(len(reviews))
+    for idx, review in enumerate(reviews):
+        history = review.get("reviewer_history", [])
+        if history:
+            try:
+                sums[idx] = sum(map(int, history))
+            except ValueError:
+                sums[idx] = 0
+            lengths[idx] = len(history)
+    
+    scores = np.zeros(len(reviews))
+    has_history = lengths > 0
+    averages = sums[has_history] / lengths[has_history]
+    scores[has_history] = (np.minimum(averages, 5) + np.minimum(lengths[has_history], 5)) / 2
+    return scores
+
+
+def build_feature_matrix(review_data, consumer_values, ascriptions, non_ascriptions, data_source):
+    """
+    Converts a list of reviews into an (n_reviews x 8) feature matrix (columns ordered
+    as FEATURE_KEYS), a boolean validity mask marking the reviews that pass the
+    process_review filters, and the list of review IDs (None for invalid reviews).
+    Rows for invalid reviews are left as zeros.
+    Each feature column is filled for all valid reviews at once, giving the same values
+    as process_review. The consumer values do not feed any CQ, so they are not read.
+    """
+    n_reviews = len(review_data)
+    annotations = [review["summary_annotations"] for review in review_data]
+    num_annotators = np.array([sum(block["Clarity of Sentiment"].values()) for block in annotations])
+    deception_counts = itemgetter(*DECEPTION_FLAGS)
+    count_deception = np.array([sum(deception_counts(block["Review Flagged"])) for block in annotations])
+    has_source = np.array([data_source in review for review in review_data], dtype=bool)
+    valid = has_source & (num_annotators >= 1) & (count_deception == 0)
+    
+    valid_idx = np.flatnonzero(valid)
+    reviews = [review_data[idx] for idx in valid_idx.tolist()]
+    review_ids = [None] * n_reviews
+    for idx, review in zip(valid_idx.tolist(), reviews):
+        review_ids[idx] = f'{review["reviewerID"]}_{review["unixReviewTime"]}'
+    
+    columns = {}
+    blocks = [review[data_source] for review in reviews]
+    for feature in ascriptions:
+        if data_source == "summary_annotations":
+            subject = "OVERALL" if feature == "Predicted Rating" else feature
+            scores = annotation_means([block[subject] for block in blocks], include_na=feature != "Predicted Rating")
+        elif data_source == "ML Ascription":
+            scores = ml_values(blocks, feature)
+        else:
+            raise ValueError(f"Unexpected data source: {data_source}")
+        
+        # For product rating feature: compare ascription with reviewer's product score
+        if feature == "Predicted Rating":
+            product_scores = np.array([review.get("overall") for review in reviews], dtype=float)
+            columns["Product Rating"] = 5.0 - np.abs(scores - product_scores)
+        else:
+            columns[feature] = scores
+    if "verified" in non_ascriptions:
+        columns["Verified"] = np.array([5.0 if review.get("verified") == True else 0.0 for review in reviews])
+    if "image" in non_ascriptions:
+        columns["Image Exists"] = np.array([5.0 if review.get("image") else 0.0 for review in reviews])
+    if "reviewer_history" in non_ascriptions:
+        columns["Author Rating"] = history_scores(reviews)
+    
+    features = np.zeros((n_reviews, len(FEATURE_KEYS)))
+    for col, key in enumerate(FEATURE_KEYS):
+        if FEATURE_FIELDS[key] in columns:
+            features[valid_idx, col] = columns[FEATURE_FIELDS[key]]
+        elif len(reviews) > 0:
+            # As in compute_quality, a feature left out of the configuration cannot be scored
+            raise KeyError(FEATURE_FIELDS[key])
+    return features, valid, review_ids
+
+
 def consumer_value_scoring(review, consumer_val, processed, data_source):
 
     # Annotator (dictionary) or ML (single value) output for consumer value
@@ -156,8 +346,7 @@ def process_review(review, consumer_values, ascriptions, non_ascriptions, data_s
     
     # Only process reviews with at least two annotators' evaluation and have no flags for deception
     num_annotators  = sum(review["summary_annotations"]["Clarity of Sentiment"].values())
-    deception_flags = ["Bot", "Desc. not Aligned", "Disingenuous"]
-    count_deception = sum(review["summary_annotations"]["Review Flagged"][label] for label in deception_flags)
+    count_deception = sum(review["summary_annotations"]["Review Flagged"][label] for label in DECEPTION_FLAGS)
     if data_source not in review or num_annotators < 1 or count_deception != 0:
         return None
         
@@ -204,10 +393,10 @@ def process_review(review, consumer_values, ascriptions, non_ascriptions, data_s
     return processed
 
 
-def return_key_info(product_category, entry, cq1, cq2, cq3, quality):
+def return_key_info(product_category, review_id, cq1, cq2, cq3, quality):
     quality_return = {}
     quality_return["Product Category"] = product_category
-    quality_return["Review ID"] = entry["Review ID"]
+    quality_return["Review ID"] = review_id
     quality_return["CQ1"] = cq1
     quality_return["CQ2"] = cq2
     quality_return["CQ3"] = cq3
@@ -216,6 +405,136 @@ def return_key_info(product_category, entry, cq1, cq2, cq3, quality):
     return quality_return
 
 
+def new_metrics():
+    """
+    Returns an empty run metrics dict: wall time per stage in seconds, and review
+    counters per data source.
+    """
+    return {"timings": {}, "counters": {}}
+
+
+def add_timing(metrics, stage, seconds):
+    metrics["timings"][stage] = metrics["timings"].get(stage, 0.0) + seconds
+
+
+def count_reviews(metrics, data_source, counter, count=1):
+    source_counters = metrics["counters"].setdefault(data_source, {})
+    source_counters[counter] = source_counters.get(counter, 0) + count
+
+
+def count_dropped_review(metrics, review, data_source):
+    """
+    Counts each reason that process_review dropped a review for: the data source being
+    missing, no annotators, and each deception flag. A review can count under several.
+    """
+    if data_source not in review:
+        count_reviews(metrics, data_source, "missing_data_source")
+    if sum(review["summary_annotations"]["Clarity of Sentiment"].values()) < 1:
+        count_reviews(metrics, data_source, "dropped_num_annotators")
+    for label in DECEPTION_FLAGS:
+        if review["summary_annotations"]["Review Flagged"][label] != 0:
+            count_reviews(metrics, data_source, f"dropped_flag_{label}")
+
+
+def drop_reason_matrix(review_data, data_source):
+    """
+    Returns an (n_reviews x len(DROP_REASONS)) boolean matrix marking the reasons each
+    review is dropped for, as counted by count_dropped_review. A review is dropped
+    exactly when its row has any reason set.
+    """
+    reasons = np.zeros((len(review_data), len(DROP_REASONS)), dtype=bool)
+    deception_counts = itemgetter(*DECEPTION_FLAGS)
+    for idx, review in enumerate(review_data):
+        annotations = review["summary_annotations"]
+        reasons[idx, 0] = data_source not in review
+        reasons[idx, 1] = sum(annotations["Clarity of Sentiment"].values()) < 1
+        reasons[idx, 2:] = [count != 0 for count in deception_counts(annotations["Review Flagged"])]
+    return reasons
+
+
+def count_drop_reasons(metrics, data_source, reasons):
+    """
+    Adds the per-reason counters of a drop_reason_matrix to metrics for data_source.
+    """
+    for counter, count in zip(DROP_REASONS, reasons.sum(axis=0).tolist()):
+        if count > 0:
+            count_reviews(metrics, data_source, counter, count)
+
+
+def merge_metrics(metrics, other):
+    """
+    Adds the timings and counters of other into metrics.
+    """
+    for stage, seconds in other["timings"].items():
+        add_timing(metrics, stage, seconds)
+    for data_source, source_counters in other["counters"].items():
+        for counter, count in source_counters.items():
+            count_reviews(metrics, data_source, counter, count)
+    return metrics
+
+
+def save_metrics(metrics, metrics_path):
+    """
+    Writes the run metrics (stage timings in seconds and per-source review counters)
+    to metrics_path as JSON.
+    """
+    try:
+        with open(metrics_path, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, indent=4)
+        print(f"Run metrics saved to: {metrics_path}")
+    except IOError:
+        print(f"Failed to write run metrics to: {metrics_path}")
+    return metrics_path
+
+
+def score_reviews(review_data, consumer_values, ascriptions, non_ascriptions, w, data_source, batch, metrics=None):
+    """
+    Yields (review, review_id, cq1, cq2, cq3, quality) for every review in review_data
+    that passes the process_review filters. With batch=True the whole list is first
+    converted to a feature matrix and scored with compute_quality_batch.
+    If a metrics dict (see new_metrics) is given, the time spent in process_review and
+    compute_quality and the review counters for data_source are recorded in it.
+    """
+    if metrics is not None:
+        count_reviews(metrics, data_source, "reviews_seen", len(review_data))
+    
+    if not batch:
+        for review in review_data:
+            if metrics is None:
+                entry = process_review(review, consumer_values, ascriptions, non_ascriptions, data_source)
+                if entry is None:
+                    continue
+                cq1, cq2, cq3, quality = compute_quality(entry, w)
+            else:
+                start = time.perf_counter()
+                entry = process_review(review, consumer_values, ascriptions, non_ascriptions, data_source)
+                add_timing(metrics, "process_review", time.perf_counter() - start)
+                if entry is None:
+                    count_dropped_review(metrics, review, data_source)
+                    continue
+                start = time.perf_counter()
+                cq1, cq2, cq3, quality = compute_quality(entry, w)
+                add_timing(metrics, "compute_quality", time.perf_counter() - start)
+            yield review, entry["Review ID"], cq1, cq2, cq3, quality
+        return
+
+    start = time.perf_counter()
+    features, valid, review_ids = build_feature_matrix(review_data, consumer_values, ascriptions, 
+                                                       non_ascriptions, data_source)
+    if metrics is not None:
+        add_timing(metrics, "process_review", time.perf_counter() - start)
+        for idx in np.flatnonzero(~valid):
+            count_dropped_review(metrics, review_data[idx], data_source)
+        start = time.perf_counter()
+    cq1s, cq2s, cq3s, qualities = compute_quality_batch(features[valid], w)
+    if metrics is not None:
+        add_timing(metrics, "compute_quality", time.perf_counter() - start)
+    valid_idx = np.flatnonzero(valid).tolist()
+    for idx, cq1, cq2, cq3, quality in zip(valid_idx, cq1s.tolist(), cq2s.tolist(), 
+                                           cq3s.tolist(), qualities.tolist()):
+        yield review_data[idx], review_ids[idx], cq1, cq2, cq3, quality
+
+
 def write_outputs(quality_return, min_max_type):
     print(f'\nProduct Category: {quality_return["Product Category"]}')
     print(f'{min_max_type} Quality Review ID: {quality_return["Review ID"]}')
@@ -226,72 +545,737 @@ def write_outputs(quality_return, min_max_type):
     print(f'Review Quality: {quality_return["Review Quality"]}', '\n')
 
 
-def main(data_dir, consumer_values, ascriptions, non_ascriptions, w, data_source, analysis_dir, save_outputs): 
+def new_source_summary(top_k=0):
+    """
+    Returns the empty running summary kept for each data source: the CQ and quality
+    lists per product category, the current minimum and maximum quality reviews,
+    and (if top_k > 0) the top-k/bottom-k quality index.
+    """
+    return {
+        "index": new_quality_index(top_k) if top_k > 0 else None,
+        "all_cq1": {},
+        "all_cq2": {},
+        "all_cq3": {},
+        "all_quality": {},
+        "max_quality": 0,
+        "max_cq_sum": 0,
+        "min_quality": 999999,
+        "min_cq_sum": 999999,
+        "max_quality_return": None,
+        "min_quality_return": None
+    }
+
+
+def new_quality_index(top_k):
+    """
+    Returns an empty top-k/bottom-k quality index. For each product category and each
+    asin it keeps two bounded heaps, holding the top_k best and top_k worst reviews.
+    """
+    return {"top_k": top_k, "category": {}, "asin": {}}
+
+
+def index_review(index, scope, key, product_category, review_id, cq1, cq2, cq3, quality):
+    """
+    Offers one scored review to the heaps of index[scope][key]. Reviews are ranked by
+    quality, then CQ sum, then review ID, so the heaps are the same whatever order
+    reviews (or whole categories) are offered in.
+    """
+    heaps = index[scope].setdefault(key, {"best": [], "worst": []})
+    cq_sum = cq1 + cq2 + cq3
+    # heapq keeps the smallest entry on top, so each heap pops its least extreme review
+    best = (quality, cq_sum, review_id, product_category, cq1, cq2, cq3)
+    worst = (-quality, -cq_sum, review_id, product_category, cq1, cq2, cq3)
+    for heap, entry in ((heaps["best"], best), (heaps["worst"], worst)):
+        if len(heap) < index["top_k"]:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heappushpop(heap, entry)
+    return index
+
+
+def save_quality_index(index, data_source, analysis_dir):
+    """
+    Writes the index as JSON, with the reviews of each category and asin listed
+    best first (or worst first) in the return_key_info format.
+    """
+    output_path = os.path.join(analysis_dir, f"quality_index_{data_source}.json")
+    output = {"top_k": index["top_k"], "category": {}, "asin": {}}
+    for scope in ["category", "asin"]:
+        for key, heaps in index[scope].items():
+            best = sorted(heaps["best"], reverse=True)
+            worst = sorted(heaps["worst"], reverse=True)
+            output[scope][key] = {
+                "best": [return_key_info(category, review_id, cq1, cq2, cq3, quality) 
+                         for quality, _, review_id, category, cq1, cq2, cq3 in best],
+                "worst": [return_key_info(category, review_id, cq1, cq2, cq3, -neg_quality) 
+                          for neg_quality, _, review_id, category, cq1, cq2, cq3 in worst]
+            }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=4, ensure_ascii=False)
+    print(f"Quality index saved to: {output_path}")
+    return output_path
+
+
+def query_quality_index(index_path, scope, key, which="best", n=None):
+    """
+    Returns the n best (which="best") or worst (which="worst") reviews recorded for a
+    product category (scope="category") or product (scope="asin") in a saved quality
+    index, without re-scoring. Returns an empty list for an unknown key.
+    """
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    reviews = index[scope].get(key, {}).get(which, [])
+    return reviews if n is None else reviews[:n]
+
+
+def timed_iter(items, metrics, stage):
+    """
+    Yields from items, adding the time spent producing each item to metrics[stage].
+    """
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            add_timing(metrics, stage, time.perf_counter() - start)
+            return
+        add_timing(metrics, stage, time.perf_counter() - start)
+        yield item
+
+
+def iter_chunks(reviews, chunk_size):
+    """
+    Groups an iterable of reviews into lists of at most chunk_size reviews.
+    """
+    chunk = []
+    for review in reviews:
+        chunk.append(review)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def scoring_config(w, consumer_values, ascriptions, non_ascriptions):
+    """
+    Returns a digest of the weights and feature configuration, computed once per file
+    and folded into every review's fingerprint.
+    """
+    config = json.dumps([w, consumer_values, ascriptions, non_ascriptions], sort_keys=True)
+    return hashlib.sha1(config.encode('utf-8')).hexdigest()
+
+
+def scoring_fingerprint(review, data_source, ascriptions, non_ascriptions, config):
+    """
+    Returns a digest of the inputs that feed the CQ scores of review for data_source,
+    as build_feature_matrix reads them: the annotator count and deception flags used
+    for filtering, the data source's values for the ascriptions, the review fields
+    scored directly, and the config digest of scoring_config. Scores and fingerprints
+    stored in the review are not read.
+    """
+    annotations = review["summary_annotations"]
+    block = review[data_source]
+    if data_source == "summary_annotations":
+        values = [block.get("OVERALL" if feature == "Predicted Rating" else feature) for feature in ascriptions]
+    else:
+        values = [block.get(feature) for feature in ascriptions]
+    payload = (
+        config,
+        review.get("reviewerID"),
+        review.get("unixReviewTime"),
+        review.get("overall"),
+        annotations["Clarity of Sentiment"],
+        [annotations["Review Flagged"][label] for label in DECEPTION_FLAGS],
+        values,
+        [review.get(field) for field in non_ascriptions]
+    )
+    # Marshal version 2 writes no back-references, so equal inputs always give equal bytes
+    return hashlib.sha1(marshal.dumps(payload, 2)).hexdigest()
+
+
+def stale_reviews(review_data, data_source, ascriptions, non_ascriptions, config, metrics=None):
+    """
+    Returns (review, fingerprint) for each review in review_data whose scoring inputs
+    for data_source changed since it was last scored or dropped, or that was never
+    fingerprinted. Reviews without the data source are always dropped, so they are
+    never stale. If a metrics dict is given, the up-to-date reviews are counted in it
+    as score_reviews would count them, with reused scores also as reused_scores.
+    """
+    stale = []
+    start = time.perf_counter()
+    for review in review_data:
+        if data_source not in review:
+            if metrics is not None:
+                count_reviews(metrics, data_source, "reviews_seen")
+                count_dropped_review(metrics, review, data_source)
+            continue
+        
+        fingerprint = scoring_fingerprint(review, data_source, ascriptions, non_ascriptions, config)
+        stored = review[data_source]
+        n_scores = sum(key in stored for key in SCORE_KEYS)
+        # A current fingerprint marks the review as up to date: scored, or dropped if it has no scores
+        if stored.get(FINGERPRINT_KEY) != fingerprint or n_scores not in (0, len(SCORE_KEYS)):
+            stale.append((review, fingerprint))
+        elif metrics is not None:
+            count_reviews(metrics, data_source, "reviews_seen")
+            if n_scores:
+                count_reviews(metrics, data_source, "reused_scores")
+            else:
+                count_dropped_review(metrics, review, data_source)
+    if metrics is not None:
+        add_timing(metrics, "fingerprint", time.perf_counter() - start)
+    return stale
+
+
+def rescore_reviews(review_data, consumer_values, ascriptions, non_ascriptions, w, data_source, batch, config,
+                    metrics=None):
+    """
+    Incremental counterpart of score_reviews. Only the stale reviews (see stale_reviews)
+    are passed to score_reviews. Their new scores and fingerprints are attached to the
+    reviews. A stale review that is now dropped has any old scores removed, and its
+    fingerprint records it as up to date. Returns True if any review was updated.
+    metrics is recorded as in score_reviews.
+    """
+    stale = stale_reviews(review_data, data_source, ascriptions, non_ascriptions, config, metrics)
+    rescored = {id(values[0]): values 
+                for values in score_reviews([review for review, _ in stale], consumer_values, ascriptions, 
+                                            non_ascriptions, w, data_source, batch, metrics)}
+    for review, fingerprint in stale:
+        block = review[data_source]
+        if id(review) in rescored:
+            _, _, cq1, cq2, cq3, quality = rescored[id(review)]
+            block["cq1"] = cq1
+            block["cq2"] = cq2
+            block["cq3"] = cq3
+            block["quality"] = quality
+        else:
+            for key in SCORE_KEYS:
+                block.pop(key, None)
+        block[FINGERPRINT_KEY] = fingerprint
+    return len(stale) > 0
+
+
+def new_partial(data_sources):
+    return {source: {"review_ids": [], "asins": [], "cq1": [], "cq2": [], "cq3": [], "quality": []} 
+            for source in data_sources}
 
-    review_scores = {}
-    max_quality = 0
-    max_cq_sum = 0
-    min_quality = 999999
-    min_cq_sum = 999999
-    all_cq1 = {}
-    all_cq2 = {}
-    all_cq3 = {}
-    all_quality = {}
+
+def append_result(results, review, review_id, cq1, cq2, cq3, quality):
+    results["review_ids"].append(review_id)
+    results["asins"].append(review.get("asin"))
+    results["cq1"].append(cq1)
+    results["cq2"].append(cq2)
+    results["cq3"].append(cq3)
+    results["quality"].append(quality)
+
+
+def collect_stored_scores(review_data, data_source, results):
+    """
+    Appends the scores attached to the reviews for data_source to results, in file
+    order. After rescore_reviews these are exactly the reviews that pass the filters.
+    """
+    for review in review_data:
+        stored = review.get(data_source)
+        if isinstance(stored, dict) and "quality" in stored:
+            review_id = f'{review["reviewerID"]}_{review["unixReviewTime"]}'
+            append_result(results, review, review_id, stored["cq1"], stored["cq2"], stored["cq3"], stored["quality"])
+
+
+def stored_partial(file_path, ascriptions, non_ascriptions, data_sources, chunk_size, config, metrics=None):
+    """
+    Reads a category file without rewriting it. If every review is up to date for every
+    data source, returns the file's partial results from the stored scores, as
+    score_category would. Returns None at the first stale review, so that only files
+    with changes are re-encoded. The read is timed in metrics either way, but the
+    reviews are only counted when the stored scores are used.
+    """
+    check_metrics = new_metrics() if metrics is not None else None
+    reviews = iter_json_array(file_path)
+    if check_metrics is not None:
+        reviews = timed_iter(reviews, check_metrics, "json_load")
     
+    def read_partial():
+        partial = new_partial(data_sources)
+        for chunk in iter_chunks(reviews, chunk_size):
+            for source in data_sources:
+                if stale_reviews(chunk, source, ascriptions, non_ascriptions, config, check_metrics):
+                    return None
+                collect_stored_scores(chunk, source, partial[source])
+        return partial
     
-    for file_name in os.listdir(data_dir):
-        print(f"Processing {file_name}")
-        file_path = os.path.join(data_dir, file_name)
-        with open(os.path.join(data_dir, file_name), 'r') as f:
+    partial = read_partial()
+    if metrics is not None:
+        if partial is None:
+            # The reviews are counted again when the file is rescored
+            check_metrics["counters"] = {}
+        merge_metrics(metrics, check_metrics)
+    return partial
+
+
+def score_category(file_path, consumer_values, ascriptions, non_ascriptions, w, data_sources, save_outputs, batch,
+                   stream=False, chunk_size=10000, cache_dir=None, incremental=False, collect_metrics=False):
+    """
+    Scores every review in one category file for each data source, attaches the CQ
+    values to the reviews and (if save_outputs) writes the file back. Returns the
+    per-source partial results as a dict of source -> {"review_ids", "asins", "cq1",
+    "cq2", "cq3", "quality"} lists, in file order, for merge_category_results,
+    together with the file's run metrics (None unless collect_metrics).
+    With stream=True the file is read and rewritten chunk_size reviews at a time,
+    so memory use does not grow with the size of the file.
+    With batch=True, save_outputs=False and a cache_dir, the features are read from
+    the feature cache instead (see score_cached_category).
+    With incremental=True only reviews whose scoring inputs changed are rescored (see
+    rescore_reviews), and the file is only rewritten if at least one review was. When
+    streaming, the file is first checked without a writer (see stored_partial), so an
+    unchanged file is never re-encoded.
+    """
+    if batch and not save_outputs and cache_dir is not None:
+        return score_cached_category(file_path, consumer_values, ascriptions, non_ascriptions, w, 
+                                     data_sources, cache_dir, collect_metrics)
+    
+    print(f"Processing {os.path.basename(file_path)}")
+    metrics = new_metrics() if collect_metrics else None
+    config = scoring_config(w, consumer_values, ascriptions, non_ascriptions) if incremental else None
+    if incremental and stream and save_outputs:
+        partial = stored_partial(file_path, ascriptions, non_ascriptions, data_sources, chunk_size, config, metrics)
+        if partial is not None:
+            print(f"No reviews rescored in {os.path.basename(file_path)}; file left unchanged")
+            return partial, metrics
+    
+    start = time.perf_counter()
+    if stream:
+        reviews = iter_json_array(file_path)
+        if metrics is not None:
+            reviews = timed_iter(reviews, metrics, "json_load")
+    else:
+        with open(file_path, 'r') as f:
             review_data = json.load(f)
+        reviews = review_data
+        if metrics is not None:
+            add_timing(metrics, "json_load", time.perf_counter() - start)
+    
+    partial = new_partial(data_sources)
+    changed = False
+    
+    def scored_chunks():
+        nonlocal changed
+        for chunk in iter_chunks(reviews, chunk_size):
+            for source in data_sources:
+                results = partial[source]
+                
+                # Process each review in the chunk.
+                if incremental:
+                    if rescore_reviews(chunk, consumer_values, ascriptions, non_ascriptions, w, source, batch, 
+                                       config, metrics):
+                        changed = True
+                    collect_stored_scores(chunk, source, results)
+                    continue
+                
+                for review, review_id, cq1, cq2, cq3, quality in score_reviews(chunk, consumer_values, ascriptions, 
+                                                                               non_ascriptions, w, source, batch, 
+                                                                               metrics):
+                    append_result(results, review, review_id, cq1, cq2, cq3, quality)
+                    
+                    # Attach the computed values under the data source key in the original review dict:
+                    review[source]["cq1"] = cq1
+                    review[source]["cq2"] = cq2
+                    review[source]["cq3"] = cq3
+                    review[source]["quality"] = quality
+                    changed = True
+            yield from chunk
+
+    # After processing all reviews in this file for every source, overwrite it with the new data,
+    # unless an incremental run found nothing to rescore.
+    if stream and save_outputs:
+        start = time.perf_counter()
+        timed = sum(metrics["timings"].values()) if metrics is not None else 0.0
+        write_json_array(file_path, scored_chunks(), indent=4, ensure_ascii=False, 
+                         replace_if=lambda: changed or not incremental)
+        if metrics is not None:
+            # Reading and scoring happen inside the write, so their time is taken out
+            timed = sum(metrics["timings"].values()) - timed
+            add_timing(metrics, "json_dump", time.perf_counter() - start - timed)
+    else:
+        for _ in scored_chunks():
+            pass
+        if save_outputs and (changed or not incremental):
+            start = time.perf_counter()
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(review_data, f, indent=4, ensure_ascii=False)
+            if metrics is not None:
+                add_timing(metrics, "json_dump", time.perf_counter() - start)
+    if incremental and not changed:
+        print(f"No reviews rescored in {os.path.basename(file_path)}; file left unchanged")
+            
+    return partial, metrics
+
+
+def extract_feature_columns(file_path, columns, consumer_values, ascriptions, non_ascriptions):
+    """
+    Feature cache extractor: returns the "<source>:features" matrix and "<source>:valid"
+    mask of build_feature_matrix and the "<source>:drop_reasons" matrix of
+    drop_reason_matrix for every source named in columns, plus the
+    "review_ids" of the reviews (empty strings where no source is valid) and their
+    "asins" (empty strings where missing).
+    """
+    sources = sorted({column.rsplit(":", 1)[0] for column in columns if ":" in column})
+    review_data = list(iter_json_array(file_path))
+    
+    extracted = {}
+    review_ids = [""] * len(review_data)
+    for source in sources:
+        features, valid, source_ids = build_feature_matrix(review_data, consumer_values, ascriptions, 
+                                                           non_ascriptions, source)
+        extracted[f"{source}:features"] = features
+        extracted[f"{source}:valid"] = valid
+        extracted[f"{source}:drop_reasons"] = drop_reason_matrix(review_data, source)
+        for idx in np.flatnonzero(valid):
+            review_ids[idx] = source_ids[idx]
+    extracted["review_ids"] = np.array(review_ids, dtype=str)
+    extracted["asins"] = np.array([str(review.get("asin") or "") for review in review_data], dtype=str)
+    return extracted
+
+
+def load_cached_features(file_path, consumer_values, ascriptions, non_ascriptions, data_sources, cache_dir):
+    """
+    Returns the memory-mapped "review_ids" and "asins" columns and the "<source>:features",
+    "<source>:valid" and "<source>:drop_reasons" columns of each data source for one file
+    from the feature cache.
+    """
+    # The extracted features depend on the scoring configuration, so it is part of the cache namespace
+    config = json.dumps([consumer_values, ascriptions, non_ascriptions])
+    namespace = "s13_features_" + hashlib.sha1(config.encode('utf-8')).hexdigest()[:12]
+    extractor = functools.partial(extract_feature_columns, consumer_values=consumer_values, ascriptions=ascriptions, 
+                                  non_ascriptions=non_ascriptions)
+    columns = ["review_ids", "asins"] + [f"{source}:{column}" for source in data_sources 
+                                         for column in ["features", "valid", "drop_reasons"]]
+    return load_columns(file_path, columns, extractor, namespace, cache_dir)
+
+
+def score_cached_category(file_path, consumer_values, ascriptions, non_ascriptions, w, data_sources, cache_dir,
+                          collect_metrics=False):
+    """
+    Read-only counterpart of score_category for batch runs that do not save outputs:
+    the feature matrices come memory-mapped from the feature cache, so the JSON is
+    only parsed when the file is new or has changed since it was cached.
+    """
+    print(f"Processing {os.path.basename(file_path)}")
+    metrics = new_metrics() if collect_metrics else None
+    
+    start = time.perf_counter()
+    cached = load_cached_features(file_path, consumer_values, ascriptions, non_ascriptions, data_sources, cache_dir)
+    if metrics is not None:
+        add_timing(metrics, "feature_cache", time.perf_counter() - start)
+    
+    results = {}
+    for source in data_sources:
+        valid = np.asarray(cached[f"{source}:valid"])
+        if metrics is not None:
+            count_reviews(metrics, source, "reviews_seen", len(valid))
+            count_drop_reasons(metrics, source, np.asarray(cached[f"{source}:drop_reasons"]))
+        start = time.perf_counter()
+        cq1s, cq2s, cq3s, qualities = compute_quality_batch(cached[f"{source}:features"][valid], w)
+        if metrics is not None:
+            add_timing(metrics, "compute_quality", time.perf_counter() - start)
+        results[source] = {
+            "review_ids": cached["review_ids"][valid].tolist(), 
+            "asins": cached["asins"][valid].tolist(), 
+            "cq1": cq1s.tolist(), 
+            "cq2": cq2s.tolist(), 
+            "cq3": cq3s.tolist(), 
+            "quality": qualities.tolist()
+        }
+    return results, metrics
+
+
+def merge_category_results(summaries, product_category, partial):
+    """
+    Folds the partial results of one category into the running per-source summaries.
+    The min/max checks are replayed over the category's reviews in file order, so
+    merging categories in listing order reproduces a serial run exactly, ties included.
+    The reviews are also offered to the summary's quality index, if it has one.
+    """
+    for source, results in partial.items():
+        summary = summaries[source]
+        summary["all_cq1"][product_category] = results["cq1"]
+        summary["all_cq2"][product_category] = results["cq2"]
+        summary["all_cq3"][product_category] = results["cq3"]
+        summary["all_quality"][product_category] = results["quality"]
         
-        product_category = file_name[:-14]
-        
-        all_cq1[product_category] = []
-        all_cq2[product_category] = []
-        all_cq3[product_category] = []
-        all_quality[product_category] = []
-        
-        # Process each review in the dataset.
-        for review in review_data:
-            entry = process_review(review, consumer_values, ascriptions, non_ascriptions, data_source)
-            if entry is None:
-                continue       
+        index = summary["index"]
+        for review_id, asin, cq1, cq2, cq3, quality in zip(results["review_ids"], results["asins"], results["cq1"], 
+                                                          results["cq2"], results["cq3"], results["quality"]):
+            if index is not None:
+                index_review(index, "category", product_category, product_category, review_id, cq1, cq2, cq3, quality)
+                if asin:
+                    index_review(index, "asin", asin, product_category, review_id, cq1, cq2, cq3, quality)
             
-            cq1, cq2, cq3, quality = compute_quality(entry, w)
             cq_sum = cq1 + cq2 + cq3
-            
-            # Append to the summary dictionaries
-            all_cq1[product_category].append(cq1)
-            all_cq2[product_category].append(cq2)
-            all_cq3[product_category].append(cq3)
-            all_quality[product_category].append(quality)
-            
-            # Attach the computed values under the data_source key in the original review dict:
-            review[data_source]["cq1"] = cq1
-            review[data_source]["cq2"] = cq2
-            review[data_source]["cq3"] = cq3
-            review[data_source]["quality"] = quality
-    
-            if quality >= max_quality and cq_sum > max_cq_sum:
-                max_quality_return = return_key_info(product_category, entry, cq1, cq2, cq3, quality)
-                max_quality = quality
-                max_cq_sum = cq_sum
+            if quality >= summary["max_quality"] and cq_sum > summary["max_cq_sum"]:
+                summary["max_quality_return"] = return_key_info(product_category, review_id, cq1, cq2, cq3, quality)
+                summary["max_quality"] = quality
+                summary["max_cq_sum"] = cq_sum
+                
+            if quality <= summary["min_quality"] and cq_sum < summary["min_cq_sum"]:
+                summary["min_quality_return"] = return_key_info(product_category, review_id, cq1, cq2, cq3, quality)
+                summary["min_quality"] = quality
+                summary["min_cq_sum"] = cq_sum
                 
-            if quality <= min_quality and cq_sum < min_cq_sum:
-                min_quality_return = return_key_info(product_category, entry, cq1, cq2, cq3, quality)
-                min_quality = quality
-                min_cq_sum = cq_sum
+    return summaries
+
+
+def weight_matrix(weight_dicts):
+    """
+    Stacks a list of weight dicts (as w) into a (K x 8) matrix with columns ordered as FEATURE_KEYS.
+    """
+    return np.array([[weights[key] for key in FEATURE_KEYS] for weights in weight_dicts], dtype=float)
+
+
+def random_weight_matrix(n_vectors, seed=None):
+    """
+    Draws n_vectors weight vectors, uniformly over the weights of each CQ that sum to 1.0
+    (a flat Dirichlet per feature set). Returns a (n_vectors x 8) matrix.
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.zeros((n_vectors, len(FEATURE_KEYS)))
+    for feature_set in CQ_FEATURE_SETS:
+        idx = [FEATURE_KEYS.index(feature) for feature in feature_set]
+        weights[:, idx] = rng.dirichlet(np.ones(len(idx)), size=n_vectors)
+    return weights
+
+
+def sweep_quality(features, weights):
+    """
+    Computes CQ1, CQ2, CQ3 and quality for every review under each of K weight vectors
+    at once. features is the (n_reviews x 8) matrix of build_feature_matrix and weights
+    a (K x 8) matrix such as weight_matrix returns. Each CQ is accumulated feature by
+    feature over all K vectors, elementwise, so a vector's scores do not depend on
+    how many other vectors are swept with it.
+    Returns (cq1, cq2, cq3, quality), each of shape (n_reviews x K).
+    Unlike compute_CQ, each CQ's weights only need to sum to 1.0 within floating point
+    tolerance, since randomly drawn weights rarely sum to exactly 1.0.
+    """
+    features = np.asarray(features, dtype=float)
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    
+    cqs = []
+    for feature_set in CQ_FEATURE_SETS:
+        idx = [FEATURE_KEYS.index(feature) for feature in feature_set]
+        denominator = weights[:, idx].sum(axis=1)
+        if not np.allclose(denominator, 1.0):
+            bad_rows = np.flatnonzero(~np.isclose(denominator, 1.0)).tolist()
+            raise ValueError(f"Sum of weights should be equal to 1.0 (weight vectors {bad_rows})")
+        cq = np.zeros((features.shape[0], weights.shape[0]))
+        for col in idx:
+            cq += features[:, col, None] * (weights[:, col] / denominator)
+        cqs.append(cq)
+        
+    quality = np.minimum(np.minimum(cqs[0], cqs[1]), cqs[2])
+    return cqs[0], cqs[1], cqs[2], quality
+
+
+def load_sweep_features(data_dir, consumer_values, ascriptions, non_ascriptions, data_source, cache_dir=None):
+    """
+    Collects the feature matrix and review IDs of every scoreable review in data_dir
+    for one data source, reading from the feature cache when cache_dir is given.
+    """
+    features = []
+    review_ids = []
+    for file_name in os.listdir(data_dir):
+        if not file_name.lower().endswith(".json"):
+            continue
+        file_path = os.path.join(data_dir, file_name)
+        if cache_dir is not None:
+            cached = load_cached_features(file_path, consumer_values, ascriptions, non_ascriptions, 
+                                          [data_source], cache_dir)
+            file_features = cached[f"{data_source}:features"]
+            valid = np.asarray(cached[f"{data_source}:valid"])
+            file_ids = cached["review_ids"].tolist()
+        else:
+            file_features, valid, file_ids = build_feature_matrix(list(iter_json_array(file_path)), consumer_values, 
+                                                                  ascriptions, non_ascriptions, data_source)
+        features.append(file_features[valid])
+        review_ids.extend(file_ids[idx] for idx in np.flatnonzero(valid))
+        
+    features = np.vstack(features) if features else np.zeros((0, len(FEATURE_KEYS)))
+    return features, review_ids
 
-        # After processing all reviews in this file, overwrite it with the new data
+
+def rank_columns(values):
+    # Average ranks of each column, as used for Spearman's rho
+    return rankdata(values, axis=0)
+
+
+def column_quantiles(values, percents):
+    """
+    Linear-interpolation percentiles (NumPy's default method) of each column of values,
+    as a (len(percents) x columns) array. Every column is interpolated elementwise, so
+    its result does not depend on the other columns in the block.
+    """
+    ordered = np.sort(values, axis=0)
+    positions = np.asarray(percents, dtype=float) / 100 * (values.shape[0] - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, values.shape[0] - 1)
+    fraction = (positions - lower)[:, None]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+
+
+def sweep_weights(features, review_ids, weights, baseline_w, top_n=10, block_size=None):
+    """
+    Sensitivity analysis of the quality scores to the CQ weights. For each row of the
+    (K x 8) weights matrix, reports the distribution of review quality, the top_n and
+    bottom_n reviews, and how these compare with the baseline weights baseline_w: the
+    Spearman correlation of the quality scores and the overlap of the top/bottom
+    reviews. Weight vectors are processed block_size at a time to bound memory; by
+    default as many as keep each block within SWEEP_BLOCK_ELEMENTS quality values
+    (at least one). The results do not depend on the block size.
+    Ties at the top/bottom cut-off are broken arbitrarily.
+    Returns a list with one result dict per weight vector.
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    review_ids = np.asarray(review_ids)
+    top_n = min(top_n, len(review_ids))
+    if top_n == 0:
+        return []
+    
+    def top_bottom(quality):
+        # Indices of the top_n highest and lowest quality reviews per column, best/worst first
+        order = np.argpartition(-quality, top_n - 1, axis=0)[:top_n]
+        top = np.take_along_axis(order, np.argsort(-np.take_along_axis(quality, order, axis=0), axis=0), axis=0)
+        order = np.argpartition(quality, top_n - 1, axis=0)[:top_n]
+        bottom = np.take_along_axis(order, np.argsort(np.take_along_axis(quality, order, axis=0), axis=0), axis=0)
+        return top, bottom
+    
+    baseline_quality = sweep_quality(features, weight_matrix([baseline_w]))[3]
+    baseline_top, baseline_bottom = top_bottom(baseline_quality)
+    baseline_top, baseline_bottom = set(baseline_top[:, 0].tolist()), set(baseline_bottom[:, 0].tolist())
+    baseline_ranks = rank_columns(baseline_quality)[:, 0]
+    baseline_ranks = baseline_ranks - baseline_ranks.mean()
+    
+    if block_size is None:
+        block_size = max(1, SWEEP_BLOCK_ELEMENTS // len(review_ids))
+    results = []
+    for start in range(0, weights.shape[0], block_size):
+        block = weights[start:start + block_size]
+        quality = sweep_quality(features, block)[3]
+        
+        quantiles = column_quantiles(quality, [0, 25, 50, 75, 100]).tolist()
+        mean = quality.mean(axis=0).tolist()
+        std = quality.std(axis=0).tolist()
+        
+        # Spearman's rho against the baseline: Pearson correlation of the centred ranks
+        ranks = rank_columns(quality)
+        ranks = ranks - ranks.mean(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rho = (baseline_ranks @ ranks) / np.sqrt((baseline_ranks @ baseline_ranks) * (ranks * ranks).sum(axis=0))
+        rho = rho.tolist()
+        
+        top, bottom = top_bottom(quality)
+        for col in range(block.shape[0]):
+            top_col, bottom_col = top[:, col].tolist(), bottom[:, col].tolist()
+            results.append({
+                "weights": dict(zip(FEATURE_KEYS, block[col].tolist())),
+                "mean": mean[col],
+                "std": std[col],
+                "min": quantiles[0][col],
+                "q25": quantiles[1][col],
+                "median": quantiles[2][col],
+                "q75": quantiles[3][col],
+                "max": quantiles[4][col],
+                "spearman_vs_baseline": rho[col],
+                "top_overlap": len(baseline_top.intersection(top_col)) / top_n,
+                "bottom_overlap": len(baseline_bottom.intersection(bottom_col)) / top_n,
+                "top_reviews": review_ids[top_col].tolist(),
+                "bottom_reviews": review_ids[bottom_col].tolist()
+            })
+    return results
+
+
+def save_sweep_results(results, data_source, analysis_dir):
+    """
+    Saves the sweep_weights results as one CSV row per weight vector.
+    """
+    output_path = os.path.join(analysis_dir, f"weight_sweep_{data_source}.csv")
+    stat_names = ["mean", "std", "min", "q25", "median", "q75", "max", 
+                  "spearman_vs_baseline", "top_overlap", "bottom_overlap"]
+    fieldnames = FEATURE_KEYS + stat_names + ["top_reviews", "bottom_reviews"]
+    try:
+        with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            for result in results:
+                row = dict(result["weights"])
+                row.update({name: result[name] for name in stat_names})
+                row["top_reviews"] = " ".join(result["top_reviews"])
+                row["bottom_reviews"] = " ".join(result["bottom_reviews"])
+                writer.writerow(row)
+        print(f"Weight sweep saved to CSV at: {output_path}")
+    except IOError as e:
+        print(f"Error: Unable to write CSV file at '{output_path}': {e}")
+
+
+def main(data_dir, consumer_values, ascriptions, non_ascriptions, w, data_source, analysis_dir, save_outputs,
+         batch=False, workers=1, stream=False, chunk_size=10000, cache_dir=None, incremental=False, top_k=0,
+         metrics_path=None): 
+
+    # data_source may be a single source or a list of sources, all of which are scored
+    # in one pass over each file so that every file is read and written only once.
+    data_sources = [data_source] if isinstance(data_source, str) else list(data_source)
+    summaries = {source: new_source_summary(top_k) for source in data_sources}
+    
+    file_names = [file_name for file_name in os.listdir(data_dir) if file_name.lower().endswith(".json")]
+    file_paths = [os.path.join(data_dir, file_name) for file_name in file_names]
+    # Per-stage timings and review counters are only collected when they will be written out
+    collect_metrics = metrics_path is not None
+    metrics = new_metrics() if collect_metrics else None
+    run_start = time.perf_counter()
+    args = (consumer_values, ascriptions, non_ascriptions, w, data_sources, save_outputs, batch, stream, chunk_size, 
+            cache_dir, incremental, collect_metrics)
+    
+    # Categories are independent, so with workers > 1 they are scored in a process pool.
+    # Partial results are merged in listing order either way, so the outputs are identical.
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = executor.map(score_category, file_paths, *[repeat(arg) for arg in args])
+            for file_name, (partial, file_metrics) in zip(file_names, partials):
+                merge_category_results(summaries, file_name[:-14], partial)
+                if metrics is not None:
+                    merge_metrics(metrics, file_metrics)
+    else:
+        for file_name, file_path in zip(file_names, file_paths):
+            partial, file_metrics = score_category(file_path, *args)
+            merge_category_results(summaries, file_name[:-14], partial)
+            if metrics is not None:
+                merge_metrics(metrics, file_metrics)
+    
+    for source in data_sources:
+        summary = summaries[source]
+        if len(data_sources) > 1:
+            print(f"\nData source: {source}")
         if save_outputs:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(review_data, f, indent=4, ensure_ascii=False)
+            start = time.perf_counter()
+            plot_cq_distributions(summary["all_cq1"], summary["all_cq2"], summary["all_cq3"], 
+                                  summary["all_quality"], source, analysis_dir)
+            if metrics is not None:
+                add_timing(metrics, "plotting", time.perf_counter() - start)
+            if summary["index"] is not None:
+                save_quality_index(summary["index"], source, analysis_dir)
+        if summary["min_quality_return"] is None:
+            print(f"No reviews could be scored for data source: {source}")
+            continue
+        write_outputs(summary["min_quality_return"], "Minimum")
+        write_outputs(summary["max_quality_return"], "Maximum")       
     
-    if save_outputs:
-        plot_cq_distributions(all_cq1, all_cq2, all_cq3, all_quality, data_source, analysis_dir)
-    write_outputs(min_quality_return, "Minimum")
-    write_outputs(max_quality_return, "Maximum")       
+    if metrics is not None:
+        metrics["total_seconds"] = time.perf_counter() - run_start
+        metrics["files"] = len(file_names)
+        metrics["workers"] = workers
+        metrics["data_sources"] = data_sources
+        metrics["timings_note"] = ("Stage timings are summed over all workers, so with workers > 1 "
+                                   "their total can exceed total_seconds")
+        save_metrics(metrics, metrics_path)
     
     return
 
@@ -301,6 +1285,15 @@ if __name__ == "__main__":
     data_dir     = 'ML_datasets'
     analysis_dir = "Analysis"
     save_outputs = True
+    batch        = True  # Score each category as NumPy feature arrays rather than review by review
+    workers      = os.cpu_count() or 1  # Number of categories scored in parallel
+    stream       = True  # Read and rewrite each category file incrementally, in chunks of reviews
+    chunk_size   = 10000
+    cache_dir    = CACHE_DIR  # Feature cache, used by batch runs with save_outputs = False
+    sweep_size   = 0  # Number of random weight vectors for the weight sensitivity sweep (0 = no sweep)
+    incremental  = True  # Only rescore reviews whose inputs changed, and only rewrite changed files
+    top_k        = 10  # Number of best and worst reviews indexed per category and per product
+    metrics_path = os.path.join(analysis_dir, f"s13_metrics_{time.strftime('%Y%m%d_%H%M%S')}.json")  # None = off
       
     consumer_values = [
               "Efficiency",
@@ -329,5 +1322,16 @@ if __name__ == "__main__":
     
     w = {"FUrev": 0.023912, "ITrev": 0.126529, "CErev": 0.849559, "ARrev": 0.761987, "IErev": 0.023478, "Vrev": 0.214535, "CSrev": 0.195492, "PRrev": 0.804508} 
     
-    main(data_dir, consumer_values, ascriptions, non_ascriptions, w, "summary_annotations", analysis_dir, save_outputs)
-    main(data_dir, consumer_values, ascriptions, non_ascriptions, w, "ML Ascription", analysis_dir, save_outputs)
+    # Score both the annotator and ML sources in a single pass over each file
+    data_sources = ["summary_annotations", "ML Ascription"]
+    main(data_dir, consumer_values, ascriptions, non_ascriptions, w, data_sources, analysis_dir, save_outputs, batch, workers,
+         stream, chunk_size, cache_dir, incremental, top_k, metrics_path)
+
+    # Sensitivity of the quality scores to the CQ weights, against the Decision Tree weights
+    if sweep_size > 0:
+        sweep_w = random_weight_matrix(sweep_size, seed=0)
+        for source in data_sources:
+            features, review_ids = load_sweep_features(data_dir, consumer_values, ascriptions, non_ascriptions,
+                                                       source, cache_dir)
+            results = sweep_weights(features, review_ids, sweep_w, w)
+            save_sweep_results(results, source, analysis_dir)
@@ -1,15 +1,28 @@
 """
 Version history
-v1_1 = Add statistical significance tests.
+v1_1 = Add statistical significance tests. Add vectorized bootstrap confidence
+      intervals for Pearson's r and Spearman's rho. Compute Pearson's r from
+      mergeable one-pass accumulators, per category and pooled. Add a per-category
+      breakdown of both coefficients to the CSV. Add pairwise correlation matrices
+      between any number of sources.
 v1_0 = Produces Pearson and Spearman correlation stats for review quality and CQs, 
       comparing annotator vs ML. 
 """
 
+from concurrent.futures import ProcessPoolExecutor
 import csv
 import json
+import math
 import numpy as np
 import os
-from scipy.stats import pearsonr, spearmanr
+from scipy.stats import beta, pearsonr, rankdata, spearmanr, t
+from feature_cache import CACHE_DIR, load_columns
+from json_streaming import iter_json_array
+
+
+# Upper bound on the number of resample indices drawn at once per variable,
+# which bounds the memory used by each block of bootstrap resamples
+BOOTSTRAP_BLOCK_ELEMENTS = 1 << 22
 
 
 def compute_correlations(pairs_dict):
@@ -53,77 +66,568 @@ def compute_spearman(pairs_dict):
     return results
 
 
-def gather_pairs(data_dir, source1, source2):
+def batch_pearson(values1, values2):
     """
-    Traverse all JSON files in data_dir. For each review in each file, if both
-    source1 and source2 appear as keys, extract the four numeric variables and
-    collect paired lists. Returns a dict mapping variable names to a tuple of 
-    two lists: (values_from_source1, values_from_source2).
+    Given two k x n arrays of paired values, computes Pearson's r and its two-tailed
+    p-value for each of the k rows at once, as pearsonr would row by row. Returns
+    two arrays of length k (NaN for rows where either variable is constant).
+    """
+    n = values1.shape[1]
+    deviations1 = values1 - values1.mean(axis=1, keepdims=True)
+    deviations2 = values2 - values2.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_vals = np.einsum('ij,ij->i', deviations1, deviations2) / np.sqrt(
+            np.einsum('ij,ij->i', deviations1, deviations1) * np.einsum('ij,ij->i', deviations2, deviations2))
+    r_vals = np.clip(r_vals, -1.0, 1.0)
+    if n == 2:
+        r_vals = np.round(r_vals)
+    return r_vals, pearson_pvalues(r_vals, n)
+
+
+def pearson_pvalues(r_vals, n):
+    """
+    Returns the two-tailed p-values of an array of Pearson correlations over n
+    pairs, from the exact null distribution of r as in pearsonr.
+    """
+    if n == 2:
+        return np.where(np.isnan(r_vals), np.nan, 1.0)
+    return 2 * beta.cdf(-np.abs(r_vals), n / 2 - 1, n / 2 - 1, loc=-1, scale=2)
+
+
+def spearman_pvalues(rho_vals, n):
+    """
+    Returns the two-tailed p-values of an array of Spearman correlations over n
+    pairs, from the t distribution with n - 2 degrees of freedom as in spearmanr.
+    """
+    dof = n - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_vals = rho_vals * np.sqrt((dof / ((rho_vals + 1.0) * (1.0 - rho_vals))).clip(0))
+        return 2 * t.sf(np.abs(t_vals), dof)
+
+
+def batch_spearman(values1, values2):
+    """
+    Given two k x n arrays of paired values, computes Spearman's rho and its
+    two-tailed p-value for each of the k rows at once, as spearmanr would row by
+    row. Returns two arrays of length k (NaN for rows where either variable is
+    constant).
+    """
+    rho_vals, _ = batch_pearson(rankdata(values1, axis=1), rankdata(values2, axis=1))
+    return rho_vals, spearman_pvalues(rho_vals, values1.shape[1])
+
+
+def compute_correlation_matrices(stacked):
+    """
+    Given a dict mapping variable names to k x n arrays holding each of k sources'
+    values for the same n reviews, computes every pairwise correlation between the
+    sources with one np.corrcoef over the values and one over their ranks. Returns
+    a dict: var_name -> (n, pearson, p_pearson, spearman, p_spearman), each a k x k
+    matrix (None if fewer than 2 reviews exist; NaN where a source is constant).
+    """
+    results = {}
+    for var, values in stacked.items():
+        n = values.shape[1]
+        if n < 2:
+            results[var] = (n, None, None, None, None)
+            continue
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pearson = np.clip(np.corrcoef(values), -1.0, 1.0)
+            spearman = np.clip(np.corrcoef(rankdata(values, axis=1)), -1.0, 1.0)
+        if n == 2:
+            pearson = np.round(pearson)
+        results[var] = (n, pearson, pearson_pvalues(pearson, n), spearman, spearman_pvalues(spearman, n))
+    return results
+
+
+def compute_category_correlations(category_accumulators, category_pairs=None):
+    """
+    Given a dict mapping categories to accumulator dicts (variable -> accumulator),
+    as in gather_statistics' accumulators["categories"], and a dict mapping the same
+    categories to pairs dicts (variable -> (list1, list2)), computes Pearson's r
+    from the accumulators and Spearman's rho for all variables of a category in
+    one batch from the pairs. Returns a dict: category -> (pearson_res,
+    spearman_res), each in the form returned by compute_correlations. Without
+    category_pairs, Spearman's rho is left as (n_pairs, None, None).
+    """
+    results = {}
+    for category, accumulators in category_accumulators.items():
+        pearson_res = accumulator_correlations(accumulators)
+        if category_pairs is None:
+            results[category] = (pearson_res, {var: (acc["n"], None, None) for var, acc in accumulators.items()})
+            continue
+        pairs_dict = category_pairs[category]
+        var_names = list(pairs_dict)
+        n = len(pairs_dict[var_names[0]][0]) if var_names else 0
+        if n < 2:
+            results[category] = (pearson_res, {var: (n, None, None) for var in var_names})
+            continue
+
+        values1 = np.array([pairs_dict[var][0] for var in var_names], dtype=float)
+        values2 = np.array([pairs_dict[var][1] for var in var_names], dtype=float)
+        rho_vals, p_rhos = batch_spearman(values1, values2)
+        spearman_res = {var: (n, float(rho_vals[i]), float(p_rhos[i])) for i, var in enumerate(var_names)}
+        results[category] = (pearson_res, spearman_res)
+    return results
+
+
+def new_accumulator():
+    """
+    Returns an empty one-pass accumulator for the Pearson correlation of a pair of
+    variables: the count, both means, both sums of squared deviations from the
+    mean and the sum of co-deviations.
+    """
+    return {"n": 0, "mean1": 0.0, "mean2": 0.0, "m2_1": 0.0, "m2_2": 0.0, "c12": 0.0}
+
+
+def update_accumulator(acc, value1, value2):
+    """
+    Adds one pair of values to acc with Welford's update. Returns acc.
+    """
+    acc["n"] += 1
+    delta1 = value1 - acc["mean1"]
+    delta2 = value2 - acc["mean2"]
+    acc["mean1"] += delta1 / acc["n"]
+    acc["mean2"] += delta2 / acc["n"]
+    acc["m2_1"] += delta1 * (value1 - acc["mean1"])
+    acc["m2_2"] += delta2 * (value2 - acc["mean2"])
+    acc["c12"] += delta1 * (value2 - acc["mean2"])
+    return acc
+
+
+def merge_accumulators(acc, other):
+    """
+    Merges the accumulator other into acc (Chan et al.'s pairwise update), as if
+    every pair added to other had been added to acc. Returns acc.
+    """
+    if other["n"] == 0:
+        return acc
+    n = acc["n"] + other["n"]
+    weight = acc["n"] * other["n"] / n
+    delta1 = other["mean1"] - acc["mean1"]
+    delta2 = other["mean2"] - acc["mean2"]
+    acc["m2_1"] += other["m2_1"] + delta1 * delta1 * weight
+    acc["m2_2"] += other["m2_2"] + delta2 * delta2 * weight
+    acc["c12"] += other["c12"] + delta1 * delta2 * weight
+    acc["mean1"] += delta1 * other["n"] / n
+    acc["mean2"] += delta2 * other["n"] / n
+    acc["n"] = n
+    return acc
+
+
+def accumulator_from_arrays(values1, values2):
+    """
+    Returns the accumulator of two equal-length arrays of paired values, computed
+    in one vectorized step.
+    """
+    acc = new_accumulator()
+    if len(values1) == 0:
+        return acc
+    values1 = np.asarray(values1, dtype=float)
+    values2 = np.asarray(values2, dtype=float)
+    acc["n"] = len(values1)
+    acc["mean1"] = float(values1.mean())
+    acc["mean2"] = float(values2.mean())
+    deviations1 = values1 - acc["mean1"]
+    deviations2 = values2 - acc["mean2"]
+    acc["m2_1"] = float(deviations1 @ deviations1)
+    acc["m2_2"] = float(deviations2 @ deviations2)
+    acc["c12"] = float(deviations1 @ deviations2)
+    return acc
+
+
+def accumulator_correlation(acc):
+    """
+    Returns (n_pairs, r_value, p_value) from an accumulator, as compute_correlations
+    would for the same pairs, with the two-tailed p-value from pearson_pvalues.
+    Returns (n_pairs, None, None) if fewer than 2 pairs exist, and NaNs if either
+    variable is constant.
+    """
+    n = acc["n"]
+    if n < 2:
+        return (n, None, None)
+    denominator = math.sqrt(acc["m2_1"] * acc["m2_2"])
+    if denominator == 0:
+        return (n, math.nan, math.nan)
+    r_val = max(-1.0, min(1.0, acc["c12"] / denominator))
+    if n == 2:
+        r_val = float(round(r_val))
+    return (n, r_val, float(pearson_pvalues(np.float64(r_val), n)))
+
+
+def accumulator_correlations(accumulators):
+    """
+    Given a dict mapping variable names to accumulators, returns a dict:
+      var_name -> (n_pairs, r_value, p_value), as compute_correlations.
+    """
+    return {var: accumulator_correlation(acc) for var, acc in accumulators.items()}
+
+
+def moment_columns(data):
+    """
+    Standardizes the four rows of data (values1, values2, ranks1, ranks2) and returns
+    the n x 10 matrix of their values, squares and the two cross products, whose
+    count-weighted column sums give both correlations of any resample.
+    """
+    scale = data.std(axis=1, keepdims=True)
+    z = (data - data.mean(axis=1, keepdims=True)) / np.where(scale > 0, scale, 1.0)
+    return np.column_stack([z.T, (z ** 2).T, z[0] * z[1], z[2] * z[3]])
+
+
+def resampled_correlations(moments, counts):
+    """
+    Returns the Pearson correlations of columns 0-1 and columns 2-3 of the data
+    behind moments (see moment_columns) for each resample, given as a b x n matrix
+    of how often each observation was drawn, as two arrays of length b. A resample
+    without variance in one of the columns gives NaN.
+    """
+    n = counts.shape[1]
+    sums = counts @ moments / n
+    means = sums[:, 0:4]
+    variances = sums[:, 4:8] - means ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r1 = (sums[:, 8] - means[:, 0] * means[:, 1]) / np.sqrt(variances[:, 0] * variances[:, 1])
+        r2 = (sums[:, 9] - means[:, 2] * means[:, 3]) / np.sqrt(variances[:, 2] * variances[:, 3])
+    return r1, r2
+
+
+def bootstrap_blocks(moments, block_sizes, seeds):
+    """
+    Draws block_sizes[i] resample index sets (as one array) with seeds[i] for each
+    block and returns the resampled (Pearson, Spearman) correlations of all blocks.
+    """
+    n = moments.shape[0]
+    pearson = []
+    spearman = []
+    for block_size, seed in zip(block_sizes, seeds):
+        indices = np.random.default_rng(seed).integers(0, n, size=(block_size, n), dtype=np.int32)
+        # One bincount over all resamples, each offset into its own run of n bins
+        offsets = np.arange(block_size)[:, None] * n
+        counts = np.bincount((indices + offsets).ravel(), minlength=block_size * n).reshape(-1, n)
+        r_pearson, r_spearman = resampled_correlations(moments, counts)
+        pearson.append(r_pearson)
+        spearman.append(r_spearman)
+    return np.concatenate(pearson), np.concatenate(spearman)
+
+
+def bootstrap_correlations(pairs_dict, n_resamples=10000, confidence=0.95, seed=0, workers=1):
+    """
+    Given a dict mapping variable names to (list1, list2), computes percentile
+    bootstrap confidence intervals for Pearson's r and Spearman's rho. Returns a
+    dict: var_name -> {"pearson": (low, high), "spearman": (low, high)}, with
+    (None, None) if fewer than 2 observations exist.
+    All resample index sets of a block are drawn as one array and both coefficients
+    are computed for the whole block at once, as a single product of the resample
+    counts with precomputed moment columns. The values are ranked once and the
+    ranks resampled, so the Spearman interval is that of the Pearson correlation
+    of the full-sample ranks. Each block has its own seed spawned from seed, so the
+    intervals do not depend on workers, the number of processes sharing the blocks.
+    """
+    alpha = (1 - confidence) / 2
+    results = {}
+    for var, (vals1, vals2) in pairs_dict.items():
+        n = len(vals1)
+        if n < 2 or n_resamples < 1:
+            results[var] = {"pearson": (None, None), "spearman": (None, None)}
+            continue
+
+        arr1 = np.array(vals1, dtype=float)
+        arr2 = np.array(vals2, dtype=float)
+        moments = moment_columns(np.vstack([arr1, arr2, rankdata(arr1), rankdata(arr2)]))
+
+        # Split the resamples into blocks of bounded size, each with its own seed
+        block_size = max(1, min(n_resamples, BOOTSTRAP_BLOCK_ELEMENTS // n))
+        block_sizes = [block_size] * (n_resamples // block_size)
+        if n_resamples % block_size:
+            block_sizes.append(n_resamples % block_size)
+        seeds = np.random.SeedSequence([seed, n]).spawn(len(block_sizes))
+
+        if workers > 1 and len(block_sizes) > 1:
+            # Each process takes a contiguous run of blocks, so moments are sent once per process
+            n_tasks = min(workers, len(block_sizes))
+            bounds = np.linspace(0, len(block_sizes), n_tasks + 1).astype(int)
+            with ProcessPoolExecutor(max_workers=n_tasks) as executor:
+                parts = list(executor.map(bootstrap_blocks, [moments] * n_tasks,
+                                          [block_sizes[a:b] for a, b in zip(bounds[:-1], bounds[1:])],
+                                          [seeds[a:b] for a, b in zip(bounds[:-1], bounds[1:])]))
+            pearson = np.concatenate([part[0] for part in parts])
+            spearman = np.concatenate([part[1] for part in parts])
+        else:
+            pearson, spearman = bootstrap_blocks(moments, block_sizes, seeds)
+
+        intervals = {}
+        for name, values in [("pearson", pearson), ("spearman", spearman)]:
+            values = values[~np.isnan(values)]
+            if values.size == 0:
+                intervals[name] = (None, None)
+            else:
+                low, high = np.quantile(values, [alpha, 1 - alpha])
+                intervals[name] = (float(low), float(high))
+        results[var] = intervals
+    return results
+
+
+def source_scores(review, source, var_names):
+    """
+    Returns the list of numeric var_names values held under review[source], or None
+    if the source is absent, is not a dict, or any variable is missing or not numeric.
+    """
+    if not isinstance(review, dict) or source not in review:
+        return None
+    sub = review[source]
+    if not isinstance(sub, dict):
+        return None
+    for var in var_names:
+        if var not in sub or not isinstance(sub[var], (int, float)):
+            return None
+    return [sub[var] for var in var_names]
+
+
+def category_name(fname):
+    """
+    Returns the product category of an ML_datasets file name, e.g. "Books" for
+    "Books_extended.json".
+    """
+    category = os.path.splitext(fname)[0]
+    return category[:-len("_extended")] if category.endswith("_extended") else category
+
+
+def read_file_statistics(full_path, source1, source2, var_names, keep_pairs=True):
+    """
+    Streams the reviews of one JSON file and returns its paired lists, in the same
+    form as gather_pairs (or None unless keep_pairs), and one accumulator per
+    variable, updated review by review.
+    """
+    file_pairs = {var: ([], []) for var in var_names} if keep_pairs else None
+    file_accumulators = {var: new_accumulator() for var in var_names}
+    for review in iter_json_array(full_path):
+        # Skip reviews unless both data sources hold every variable as a number
+        scores1 = source_scores(review, source1, var_names)
+        scores2 = source_scores(review, source2, var_names)
+        if scores1 is None or scores2 is None:
+            continue
+
+        # Append to the respective lists
+        for var, value1, value2 in zip(var_names, scores1, scores2):
+            update_accumulator(file_accumulators[var], value1, value2)
+            if keep_pairs:
+                file_pairs[var][0].append(value1)
+                file_pairs[var][1].append(value2)
+    return file_pairs, file_accumulators
+
+
+def extract_score_columns(full_path, columns):
+    """
+    Feature cache extractor for the "<source>:<var>" score columns and the
+    "<source>:valid" masks marking the reviews where that source holds every
+    variable as a number. All columns of each requested source are returned.
+    """
+    var_names = ["cq1", "cq2", "cq3", "quality"]
+    sources = sorted({column.rsplit(":", 1)[0] for column in columns})
+    values = {source: [] for source in sources}
+    valid = {source: [] for source in sources}
+    for review in iter_json_array(full_path):
+        for source in sources:
+            scores = source_scores(review, source, var_names)
+            valid[source].append(scores is not None)
+            values[source].append([0.0] * len(var_names) if scores is None else scores)
+
+    extracted = {}
+    for source in sources:
+        source_values = np.array(values[source], dtype=float).reshape(-1, len(var_names))
+        extracted[f"{source}:valid"] = np.array(valid[source], dtype=bool)
+        for idx, var in enumerate(var_names):
+            extracted[f"{source}:{var}"] = source_values[:, idx]
+    return extracted
+
+
+def read_file_sources(full_path, sources, var_names):
+    """
+    Streams the reviews of one JSON file and returns (values, complete): values is a
+    len(var_names) x k x n array of the k sources' values for the n reviews where the
+    first two sources hold every variable as a number (zeros where another source
+    does not), and complete marks the reviews where every source does.
+    """
+    rows = []
+    complete = []
+    for review in iter_json_array(full_path):
+        scores = [source_scores(review, source, var_names) for source in sources]
+        if scores[0] is None or scores[1] is None:
+            continue
+        complete.append(all(source_values is not None for source_values in scores))
+        rows.append([[0.0] * len(var_names) if source_values is None else source_values for source_values in scores])
+    # rows is n x k x len(var_names)
+    values = np.array(rows, dtype=float).reshape(-1, len(sources), len(var_names)).transpose(2, 1, 0)
+    return values, np.array(complete, dtype=bool)
+
+
+def read_cached_file_sources(full_path, sources, var_names, cache_dir):
+    """
+    As read_file_sources, but built from the score columns in the feature cache.
+    """
+    columns = [f"{source}:{column}" for source in sources for column in ["valid"] + var_names]
+    cached = load_columns(full_path, columns, extract_score_columns, "s15_scores", cache_dir)
+    mask = cached[f"{sources[0]}:valid"] & cached[f"{sources[1]}:valid"]
+    complete = np.logical_and.reduce([cached[f"{source}:valid"][mask] for source in sources])
+    values = np.array([[cached[f"{source}:{var}"][mask] for source in sources] for var in var_names], dtype=float)
+    return values, complete
+
+
+def read_cached_file_statistics(full_path, source1, source2, var_names, cache_dir, keep_pairs=True):
+    """
+    As read_file_statistics, but built from the score columns in the feature cache.
+    """
+    columns = [f"{source}:{column}" for source in (source1, source2) for column in ["valid"] + var_names]
+    cached = load_columns(full_path, columns, extract_score_columns, "s15_scores", cache_dir)
+    mask = cached[f"{source1}:valid"] & cached[f"{source2}:valid"]
+    file_pairs = {} if keep_pairs else None
+    file_accumulators = {}
+    for var in var_names:
+        values1 = cached[f"{source1}:{var}"][mask]
+        values2 = cached[f"{source2}:{var}"][mask]
+        file_accumulators[var] = accumulator_from_arrays(values1, values2)
+        if keep_pairs:
+            file_pairs[var] = (values1.tolist(), values2.tolist())
+    return file_pairs, file_accumulators
+
+
+def gather_statistics(data_dir, source1, source2, cache_dir=None, keep_pairs=True):
+    """
+    Traverse all JSON files in data_dir once. For each review in each file, if both
+    source1 and source2 appear as keys, extract the four numeric variables, collect
+    paired lists (unless keep_pairs is False) and update a one-pass correlation
+    accumulator (see new_accumulator) per variable. Returns (pairs, category_pairs,
+    accumulators): pairs maps variable names to a tuple of two lists
+    (values_from_source1, values_from_source2), or is None; category_pairs maps
+    each category (one per file) to its own pairs dict, or is None; accumulators is
+    a dict with "pooled" (variable -> accumulator over all files) and "categories"
+    (category -> variable -> accumulator). Without pairs, memory does not grow
+    with the number of reviews.
+    If cache_dir is given, the values are read from the feature cache there.
     """
     var_names = ["cq1", "cq2", "cq3", "quality"]
     # Initialise empty lists for each variable
     pairs = {
         var: ([], [])  # pairs[var][0] will collect from source1; pairs[var][1] from source2
         for var in var_names
-    }
+    } if keep_pairs else None
+    category_pairs = {} if keep_pairs else None
+    accumulators = {"pooled": {var: new_accumulator() for var in var_names}, "categories": {}}
 
     for fname in os.listdir(data_dir):
         if not fname.lower().endswith(".json"):
             continue
 
         full_path = os.path.join(data_dir, fname)
+
+        # Each file's pairs and accumulators are only kept once the whole file
+        # has parsed, so a corrupt file is still skipped entirely.
         try:
-            with open(full_path, "r", encoding="utf-8") as f:
-                reviews = json.load(f)
+            if cache_dir is None:
+                file_pairs, file_accumulators = read_file_statistics(full_path, source1, source2, var_names, 
+                                                                     keep_pairs)
+            else:
+                file_pairs, file_accumulators = read_cached_file_statistics(full_path, source1, source2, 
+                                                                            var_names, cache_dir, keep_pairs)
         except (json.JSONDecodeError, IOError) as e:
             print(f"Warning: Skipping file '{fname}' (could not read/parse): {e}")
             continue
-
-        if not isinstance(reviews, list):
-            print(f"Warning: Expected a list of review dicts in '{fname}', got {type(reviews)}. Skipping.")
+        except TypeError:
+            print(f"Warning: Expected a list of review dicts in '{fname}'. Skipping.")
             continue
 
-        for review in reviews:
-            if not isinstance(review, dict):
-                continue
+        for var in var_names:
+            merge_accumulators(accumulators["pooled"][var], file_accumulators[var])
+            if keep_pairs:
+                pairs[var][0].extend(file_pairs[var][0])
+                pairs[var][1].extend(file_pairs[var][1])
+        accumulators["categories"][category_name(fname)] = file_accumulators
+        if keep_pairs:
+            category_pairs[category_name(fname)] = file_pairs
 
-            # Check that both data sources exist in this review
-            if source1 not in review or source2 not in review:
-                continue
+    return pairs, category_pairs, accumulators
 
-            sub1 = review[source1]
-            sub2 = review[source2]
-            if not isinstance(sub1, dict) or not isinstance(sub2, dict):
-                continue
 
-            # Attempt to extract each variable
-            missing_field = False
-            for var in var_names:
-                if var not in sub1 or var not in sub2:
-                    missing_field = True
-                    break
-                if not isinstance(sub1[var], (int, float)) or not isinstance(sub2[var], (int, float)):
-                    missing_field = True
-                    break
-            if missing_field:
-                # Skip if any variable is missing or not numeric
-                continue
+def gather_source_statistics(data_dir, sources, cache_dir=None, keep_pairs=True):
+    """
+    As gather_statistics for the first two of any number of sources, but in the
+    same single traversal also stacks, for each of the four numeric variables, the
+    values of every source for the reviews where all sources hold every variable.
+    Each file's values are read once for every source; the first two sources'
+    pairs and accumulators are taken from their rows, over the reviews where both
+    hold every variable. Returns (pairs, category_pairs, accumulators, stacked),
+    where stacked maps variable names to a k x n array, one row per source in the
+    order of sources.
+    """
+    var_names = ["cq1", "cq2", "cq3", "quality"]
+    pairs = {var: ([], []) for var in var_names} if keep_pairs else None
+    category_pairs = {} if keep_pairs else None
+    accumulators = {"pooled": {var: new_accumulator() for var in var_names}, "categories": {}}
+    file_matrices = []
 
-            # Append to the respective lists
-            for var in var_names:
-                pairs[var][0].append(sub1[var])
-                pairs[var][1].append(sub2[var])
+    for fname in os.listdir(data_dir):
+        if not fname.lower().endswith(".json"):
+            continue
 
-    return pairs
+        full_path = os.path.join(data_dir, fname)
 
+        # As in gather_statistics, a corrupt file is skipped entirely
+        try:
+            if cache_dir is None:
+                values, complete = read_file_sources(full_path, sources, var_names)
+            else:
+                values, complete = read_cached_file_sources(full_path, sources, var_names, cache_dir)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Warning: Skipping file '{fname}' (could not read/parse): {e}")
+            continue
+        except TypeError:
+            print(f"Warning: Expected a list of review dicts in '{fname}'. Skipping.")
+            continue
 
-def print_comparison(pearson_res, spearman_res, source1, source2):
+        file_pairs = {} if keep_pairs else None
+        file_accumulators = {}
+        for idx, var in enumerate(var_names):
+            file_accumulators[var] = accumulator_from_arrays(values[idx, 0], values[idx, 1])
+            merge_accumulators(accumulators["pooled"][var], file_accumulators[var])
+            if keep_pairs:
+                file_pairs[var] = (values[idx, 0].tolist(), values[idx, 1].tolist())
+                pairs[var][0].extend(file_pairs[var][0])
+                pairs[var][1].extend(file_pairs[var][1])
+        accumulators["categories"][category_name(fname)] = file_accumulators
+        if keep_pairs:
+            category_pairs[category_name(fname)] = file_pairs
+        file_matrices.append(values[:, :, complete])
+
+    stacked = np.concatenate(file_matrices, axis=2) if file_matrices else np.empty((len(var_names), len(sources), 0))
+    return pairs, category_pairs, accumulators, {var: stacked[idx] for idx, var in enumerate(var_names)}
+
+
+def gather_pairs(data_dir, source1, source2, cache_dir=None):
+    """
+    Traverse all JSON files in data_dir. For each review in each file, if both
+    source1 and source2 appear as keys, extract the four numeric variables and
+    collect paired lists. Returns a dict mapping variable names to a tuple of 
+    two lists: (values_from_source1, values_from_source2).
+    If cache_dir is given, the values are read from the feature cache there.
+    """
+    return gather_statistics(data_dir, source1, source2, cache_dir)[0]
+
+
+def format_interval(interval):
+    low, high = interval
+    return "N/A" if low is None else f"[{low:.4f}, {high:.4f}]"
+
+
+def print_comparison(pearson_res, spearman_res, source1, source2, ci_res=None, category=None):
     """
     Nicely prints a side‐by‐side table of:
       variable | N_pairs | Pearson r (p‐value) | Spearman rho (p‐value)
+    followed by the bootstrap confidence intervals, if ci_res is given. If category
+    is given the table is titled as that category's breakdown.
     """
+    scope = "" if category is None else f" in category '{category}'"
     header = (
-        f"\nComparison of '{source1}' vs '{source2}':\n\n"
+        f"\nComparison of '{source1}' vs '{source2}'{scope}:\n\n"
         f"{'Variable':<10}  {'N':>5}  {'Pearson r':>10}   {'p-pearson':>10}   "
         f"{'Spearman ρ':>10}   {'p-spearman':>10}"
     )
@@ -153,11 +657,23 @@ def print_comparison(pearson_res, spearman_res, source1, source2):
         print(f"{var:<10}  {n_display:>5}  {r_str}   {p_str}   {rho_str}   {p_rho_str}")
     print()
 
+    if ci_res is not None:
+        print(f"{'Variable':<10}  {'Pearson r CI':>18}   {'Spearman ρ CI':>18}")
+        for var in pearson_res:
+            print(f"{var:<10}  {format_interval(ci_res[var]['pearson']):>18}   "
+                  f"{format_interval(ci_res[var]['spearman']):>18}")
+        print()
+
 
-def save_to_csv(pearson_res, spearman_res, source1, source2, analysis_dir):
+def save_to_csv(pearson_res, spearman_res, source1, source2, analysis_dir, ci_res=None, category_res=None):
     """
     Save results to a CSV file with columns:
       variable, n_pairs, pearson_r, p_pearson, spearman_rho, p_spearman, source1, source2
+    and, if ci_res is given, the bootstrap interval columns pearson_ci_low,
+    pearson_ci_high, spearman_ci_low and spearman_ci_high.
+    If category_res (category -> (pearson_res, spearman_res)) is given, a category
+    column is added and each category's rows follow the pooled rows, whose
+    category is "all".
     """
     output_path = os.path.join(analysis_dir, "quality_correlations.csv")
     fieldnames = [
@@ -170,52 +686,166 @@ def save_to_csv(pearson_res, spearman_res, source1, source2, analysis_dir):
         "source1",
         "source2"
     ]
+    if category_res is not None:
+        fieldnames.append("category")
+    if ci_res is not None:
+        fieldnames += ["pearson_ci_low", "pearson_ci_high", "spearman_ci_low", "spearman_ci_high"]
+
+    # The pooled results come first, then those of each category
+    scopes = [("all", pearson_res, spearman_res, ci_res)]
+    if category_res is not None:
+        scopes += [(category, category_pearson, category_spearman, None) 
+                   for category, (category_pearson, category_spearman) in category_res.items()]
     try:
         with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             writer.writeheader()
-            for var in pearson_res:
-                n_p, r_val, p_r = pearson_res[var]
-                n_s, rho_val, p_rho = spearman_res[var]
-                # If n_p != n_s, choose the smaller one for CSV (or store both as “n_p/n_s”).
-                n_pairs = n_p if n_p == n_s else f"{n_p}/{n_s}"
-
-                writer.writerow({
-                    "variable": var,
-                    "n_pairs": n_pairs,
-                    "pearson_r": "" if r_val is None else f"{r_val:.6f}",
-                    "p_pearson": "" if p_r is None else f"{p_r:.4e}",
-                    "spearman_rho": "" if rho_val is None else f"{rho_val:.6f}",
-                    "p_spearman": "" if p_rho is None else f"{p_rho:.4e}",
-                    "source1": source1,
-                    "source2": source2
-                })
+            for category, scope_pearson, scope_spearman, scope_ci in scopes:
+                for var in scope_pearson:
+                    n_p, r_val, p_r = scope_pearson[var]
+                    n_s, rho_val, p_rho = scope_spearman[var]
+                    # If n_p != n_s, choose the smaller one for CSV (or store both as “n_p/n_s”).
+                    n_pairs = n_p if n_p == n_s else f"{n_p}/{n_s}"
+
+                    row = {
+                        "variable": var,
+                        "n_pairs": n_pairs,
+                        "pearson_r": "" if r_val is None else f"{r_val:.6f}",
+                        "p_pearson": "" if p_r is None else f"{p_r:.4e}",
+                        "spearman_rho": "" if rho_val is None else f"{rho_val:.6f}",
+                        "p_spearman": "" if p_rho is None else f"{p_rho:.4e}",
+                        "source1": source1,
+                        "source2": source2
+                    }
+                    if category_res is not None:
+                        row["category"] = category
+                    if ci_res is not None:
+                        for name in ["pearson", "spearman"]:
+                            low, high = scope_ci[var][name] if scope_ci is not None else (None, None)
+                            row[f"{name}_ci_low"] = "" if low is None else f"{low:.6f}"
+                            row[f"{name}_ci_high"] = "" if high is None else f"{high:.6f}"
+                    writer.writerow(row)
         print(f"Results saved to CSV at: {output_path}")
     except IOError as e:
         print(f"Error: Unable to write CSV file at '{output_path}': {e}")
 
 
-def main():
-    data_dir = "ML_datasets"
-    analysis_dir = "Analysis"
-    source1 = "summary_annotations"
-    source2 = "ML Ascription"
-    
-    # Step 1: gather all paired values across your JSON files
-    pairs = gather_pairs(data_dir, source1, source2)
+def print_matrix_comparison(matrix_res, sources):
+    """
+    Prints, for every pair of sources, a table of:
+      variable | N | Pearson r | Spearman rho
+    taken from the correlation matrices of compute_correlation_matrices.
+    """
+    print(f"\nPairwise comparison of {len(sources)} sources:")
+    for i, j in zip(*np.triu_indices(len(sources), k=1)):
+        header = (
+            f"\n'{sources[i]}' vs '{sources[j]}':\n\n"
+            f"{'Variable':<10}  {'N':>5}  {'Pearson r':>10}   {'Spearman ρ':>10}"
+        )
+        print(header)
+        print("-" * len(header))
+        for var, (n, pearson, _, spearman, _) in matrix_res.items():
+            r_str = "N/A" if pearson is None else f"{pearson[i, j]:>10.4f}"
+            rho_str = "N/A" if spearman is None else f"{spearman[i, j]:>10.4f}"
+            print(f"{var:<10}  {n:>5}  {r_str}   {rho_str}")
+    print()
 
-    # Step 2: compute Pearson correlations
-    pearson_results = compute_correlations(pairs)
 
-    # Step 3: compute Spearman's rho correlations
-    spearman_results = compute_spearman(pairs)
+def save_matrix_to_csv(matrix_res, sources, analysis_dir):
+    """
+    Save the pairwise source correlations to a CSV file with one row per variable
+    and pair of sources, with columns:
+      variable, source1, source2, n_pairs, pearson_r, p_pearson, spearman_rho, p_spearman
+    """
+    output_path = os.path.join(analysis_dir, "quality_correlation_matrix.csv")
+    fieldnames = [
+        "variable",
+        "source1",
+        "source2",
+        "n_pairs",
+        "pearson_r",
+        "p_pearson",
+        "spearman_rho",
+        "p_spearman"
+    ]
+    try:
+        with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            for var, (n, pearson, p_pearson, spearman, p_spearman) in matrix_res.items():
+                for i, j in zip(*np.triu_indices(len(sources), k=1)):
+                    writer.writerow({
+                        "variable": var,
+                        "source1": sources[i],
+                        "source2": sources[j],
+                        "n_pairs": n,
+                        "pearson_r": "" if pearson is None else f"{pearson[i, j]:.6f}",
+                        "p_pearson": "" if p_pearson is None else f"{p_pearson[i, j]:.4e}",
+                        "spearman_rho": "" if spearman is None else f"{spearman[i, j]:.6f}",
+                        "p_spearman": "" if p_spearman is None else f"{p_spearman[i, j]:.4e}"
+                    })
+        print(f"Source correlation matrix saved to CSV at: {output_path}")
+    except IOError as e:
+        print(f"Error: Unable to write CSV file at '{output_path}': {e}")
 
-    # Step 4: print side‐by‐side
-    print_comparison(pearson_results, spearman_results, source1, source2)
 
-    # Step 5: save both results to one CSV
-    save_to_csv(pearson_results, spearman_results, source1, source2, analysis_dir)
+def main(cache_dir=None, n_resamples=10000, workers=1, seed=0, sources=None, spearman=True):
+    data_dir = "ML_datasets"
+    analysis_dir = "Analysis"
+    # The detailed comparison is of the first two sources; with more than two, the
+    # correlations between every pair of sources are also reported
+    sources = ["summary_annotations", "ML Ascription"] if sources is None else list(sources)
+    source1 = sources[0]
+    source2 = sources[1]
+    
+    # Step 1: gather the per-category and pooled correlation accumulators across your
+    # JSON files in one pass. The paired values are only kept when Spearman's rho or
+    # the bootstrap needs them, so Pearson-only runs use constant memory. With more
+    # than two sources, the same pass also stacks every source's values.
+    keep_pairs = spearman or n_resamples > 0
+    if len(sources) > 2:
+        pairs, category_pairs, accumulators, stacked = gather_source_statistics(data_dir, sources, cache_dir, 
+                                                                                keep_pairs)
+    else:
+        pairs, category_pairs, accumulators = gather_statistics(data_dir, source1, source2, cache_dir, keep_pairs)
+
+    # Step 2: compute Pearson correlations from the merged accumulators
+    pearson_results = accumulator_correlations(accumulators["pooled"])
+
+    # Step 3: compute Spearman's rho correlations (spearman = False to skip)
+    if spearman:
+        spearman_results = compute_spearman(pairs)
+    else:
+        spearman_results = {var: (acc["n"], None, None) for var, acc in accumulators["pooled"].items()}
+
+    # Step 4: bootstrap confidence intervals for both coefficients (n_resamples = 0 to skip)
+    ci_results = bootstrap_correlations(pairs, n_resamples, seed=seed, workers=workers) if n_resamples > 0 else None
+
+    # Step 5: both coefficients for every category, Pearson's r from the category
+    # accumulators and Spearman's rho from the pairs kept per category
+    category_results = compute_category_correlations(accumulators["categories"], 
+                                                     category_pairs if spearman else None)
+
+    # Step 6: print side‐by‐side, pooled and then per category
+    print_comparison(pearson_results, spearman_results, source1, source2, ci_results)
+    for category, (category_pearson, category_spearman) in category_results.items():
+        print_comparison(category_pearson, category_spearman, source1, source2, category=category)
+
+    # Step 7: save all results to one CSV
+    save_to_csv(pearson_results, spearman_results, source1, source2, analysis_dir, ci_results, category_results)
+
+    # Step 8: correlation matrices between all sources, over the reviews scored by every source
+    if len(sources) > 2:
+        matrix_results = compute_correlation_matrices(stacked)
+        print_matrix_comparison(matrix_results, sources)
+        save_matrix_to_csv(matrix_results, sources, analysis_dir)
 
 
 if __name__ == "__main__":
-    main()
+    # Reuse the per-file score columns cached by earlier runs, and spread the
+    # bootstrap resamples over all cores. Add further ML runs to sources to compare
+    # every source with every other. With spearman = False and n_resamples = 0 only
+    # Pearson's r is computed, without keeping the paired values in memory.
+    sources = ["summary_annotations", "ML Ascription"]
+    spearman = True
+    main(cache_dir=CACHE_DIR, n_resamples=10000, workers=os.cpu_count() or 1, sources=sources, spearman=spearman)
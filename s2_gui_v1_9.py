@@ -7,11 +7,14 @@ This script processes the json files containing the amazon reviews and
 produces a gui for users to annotate.
 """
 
+from array import array
 import json
+import mmap
 import os
 import tkinter as tk
 from tkinter import ttk
 from tkinter import *
+from feature_cache import file_signature
 
 
 """
@@ -25,18 +28,142 @@ def display_review_text(specific_box, specific_text):
 
 
 """
-def find_asin searches for a product code 'asin' in the meta_data
-in order to find the product information.
+def find_asin looks up a product code 'asin' in the meta_data index
+in order to find the offset of the product information.
 """
-def find_asin(meta_data, asin):
-    for i, entry in enumerate(meta_data):
-        asin_value = entry.get('asin')
-        if asin_value == asin:
-            return i
+def find_asin(meta_index, asin):
+    if asin in meta_index:
+        return meta_index[asin]
     print(f"Could not find product code in meta_data: {asin}") 
     return 'error'
 
 
+"""
+def load_meta_index returns a dict mapping each product code 'asin' to the
+byte offset of its record in the meta_data file. The index is saved next to
+the meta_data file and reused for as long as the meta_data file is unchanged,
+so the meta_data is only read in full the first time a category is opened.
+"""
+def load_meta_index(meta_file_path):
+    index_path = os.path.splitext(meta_file_path)[0] + '_asin_index.json'
+    signature = file_signature(meta_file_path)
+    if os.path.isfile(index_path):
+        try:
+            with open(index_path, 'r') as index_file:
+                stored_index = json.load(index_file)
+            if stored_index['source'] == signature:
+                return stored_index['offsets']
+        except (json.JSONDecodeError, KeyError, IOError):
+            print(f"Rebuilding unreadable meta_data index: {index_path}")
+    
+    # Keep the first record of each asin, as a search from the top would find
+    offsets = {}
+    offset = 0
+    with open(meta_file_path, 'rb') as meta_file:
+        for line in meta_file:
+            if line.strip():
+                asin = json.loads(line).get('asin')
+                if asin is not None and asin not in offsets:
+                    offsets[asin] = offset
+            offset += len(line)
+    
+    # Save the index, renamed into place so an interrupted save is never read back
+    try:
+        with open(index_path + '.tmp', 'w') as index_file:
+            json.dump({'source': signature, 'offsets': offsets}, index_file)
+        os.replace(index_path + '.tmp', index_path)
+    except IOError:
+        print(f"Could not save meta_data index: {index_path}")
+    return offsets
+
+
+"""
+def read_meta_record reads the product information at a byte offset
+of the meta_data file.
+"""
+def read_meta_record(meta_file_path, offset):
+    with open(meta_file_path, 'rb') as meta_file:
+        meta_file.seek(offset)
+        return json.loads(meta_file.readline())
+
+
+"""
+def map_file maps a file read-only into memory, so that only the parts
+that are accessed are read from disk.
+"""
+def map_file(file_path):
+    with open(file_path, 'rb') as mapped_file:
+        # An empty file cannot be mapped
+        if os.fstat(mapped_file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+"""
+def load_review_offsets returns the byte offset of each review (line) in
+the review data file, read through mmap. The offsets are built once and
+saved in the index directory, and reused for as long as the review data
+file is unchanged.
+"""
+def load_review_offsets(file_path, index_dir):
+    index_name = os.path.splitext(os.path.basename(file_path))[0]
+    offsets_path = os.path.join(index_dir, index_name + '_offsets.bin')
+    manifest_path = os.path.join(index_dir, index_name + '_offsets.json')
+    signature = file_signature(file_path)
+    stored_signature = None
+    if os.path.isfile(manifest_path) and os.path.isfile(offsets_path):
+        try:
+            with open(manifest_path, 'r') as manifest_file:
+                stored_signature = json.load(manifest_file)['source']
+        except (json.JSONDecodeError, KeyError, IOError):
+            print(f"Rebuilding unreadable review index: {manifest_path}")
+    
+    if stored_signature != signature:
+        offsets = array('Q')
+        offset = 0
+        with open(file_path, 'rb') as review_file:
+            for line in review_file:
+                if line.strip():
+                    offsets.append(offset)
+                offset += len(line)
+        
+        # The manifest is written last, so it only ever describes complete offsets
+        os.makedirs(index_dir, exist_ok=True)
+        with open(offsets_path + '.tmp', 'wb') as offsets_file:
+            offsets.tofile(offsets_file)
+        os.replace(offsets_path + '.tmp', offsets_path)
+        with open(manifest_path + '.tmp', 'w') as manifest_file:
+            json.dump({'source': signature, 'reviews': len(offsets)}, manifest_file)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    
+    return memoryview(map_file(offsets_path)).cast('Q')
+
+
+"""
+class ReviewData is a read-only list of the reviews in a review data file.
+Its length comes from the offsets index, and a review is only decoded
+when it is accessed.
+"""
+class ReviewData:
+    def __init__(self, file_path, index_dir):
+        self.offsets = load_review_offsets(file_path, index_dir)
+        self.reviews = map_file(file_path)
+    
+    def __len__(self):
+        return len(self.offsets)
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("review index out of range")
+        start = self.offsets[index]
+        end = self.reviews.find(b'\n', start)
+        if end == -1:
+            end = len(self.reviews)
+        return json.loads(self.reviews[start:end])
+
+
 """
 def get_categories gets a list of all of the Amazon categories
 from the file names in the relevant directory.
@@ -131,27 +258,29 @@ def handle_submit():
 
 
 """
-def load_data loads the review data and product meta_data for the category
+def load_data loads the review data and product meta_data indexes for the category
 """
 def load_data(category):
     # Load review JSON data
     json_dir = 'Amazon'
     review_path = 'Review_data'
+    review_index_path = 'Review_index'
     meta_path = 'Meta_data'
     
-    # Sets data and meta_data as global variables
+    # Sets data and the meta_data index and file as global variables
     global data
-    global meta_data
+    global meta_index
+    global meta_file_path
     
-    # Load the review JSON data
+    # Index the review JSON data, from which reviews are decoded on demand. The
+    # previous category's files are unmapped first, as a mapped file cannot be replaced.
+    data = None
     file_path = os.path.join(json_dir, review_path, category + '.json')
-    with open(file_path, 'r') as file:
-        data = [json.loads(line) for line in file]
+    data = ReviewData(file_path, os.path.join(json_dir, review_index_path))
     
-    # Load the meta JSON data
+    # Load the meta JSON index, from which product records are read on demand
     meta_file_path = os.path.join(json_dir, meta_path, 'meta_' + category + '.json')
-    with open(meta_file_path, 'r') as meta_file:
-        meta_data = [json.loads(line) for line in meta_file]
+    meta_index = load_meta_index(meta_file_path)
     
     return file_path, meta_file_path
 
@@ -226,13 +355,14 @@ def update_review_text(index):
         product_id = data[index]['asin']
         
         # Get meta data information
-        meta_idx = find_asin(meta_data, product_id)
+        meta_idx = find_asin(meta_index, product_id)
         if meta_idx == 'error':
             product_name = product_id
             product_desc = 'Product record missing'
         else:    
-            product_name = meta_data[meta_idx]['title']
-            temp_desc = meta_data[meta_idx]['description']
+            meta_record = read_meta_record(meta_file_path, meta_idx)
+            product_name = meta_record['title']
+            temp_desc = meta_record['description']
             if not temp_desc or temp_desc is None:
                 product_desc = 'No description'
             else:
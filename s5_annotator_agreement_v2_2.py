@@ -8,6 +8,11 @@ produces a gui for users to annotate.
 
 Change log:
 v2_2 = Adjusted proportion of annotations to reflect categories and not counts.
+    Weighted kappa computed in closed form from the count matrix. Binary and
+    ordinal matrices sliced from a dense per-file count tensor. Added agreement
+    breakdown by subject and by product category. Added bootstrap confidence
+    intervals for the kappas. Added ordinal Krippendorff's alpha over all items,
+    whatever their number of raters.
 v2_1 = Added additional summary statistics such as actual vs expected agreement.
 v2_0 = Adapted to two stage agreement: first for n/a vs ordinal agreement; then weighted
     agreement across ordinal values.
@@ -15,12 +20,26 @@ v1_1 = Added in reporting of highest and lowest kappas.
 v1_0 = Functional code.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+import csv
 import json
 import os
 import numpy as np
 from statsmodels.stats.inter_rater import fleiss_kappa
-from sklearn.metrics import cohen_kappa_score
 from itertools import combinations
+from feature_cache import CACHE_DIR, load_columns
+from s15_quality_correlation_stats_v1_1 import format_interval
+
+
+# Axes of the annotation count tensor: every annotated subject, and every label
+SUBJECTS = ["Feature Usage", "Interaction Time", "Context Experience", "Efficiency", "Excellence", "Status",
+            "Esteem", "Play", "Aesthetics", "Ethics", "Spirituality", "OVERALL", "Clarity of Sentiment"]
+LABELS = ['1', '2', '3', '4', '5', 'n/a']
+SUBJECT_INDEX = {subject: idx for idx, subject in enumerate(SUBJECTS)}
+
+# Subjects included in the binary (n/a vs ordinal) and ordinal agreement
+BINARY_SUBJECTS = np.array([subject not in ["OVERALL", "Clarity of Sentiment"] for subject in SUBJECTS])
+ORDINAL_SUBJECTS = np.array([subject != "OVERALL" for subject in SUBJECTS])
 
 
 def fleiss_kappa_components(matrix):
@@ -69,65 +88,458 @@ def load_annotations(directory):
     return annotations
 
 
-def prepare_binary_matrix(annotator_data):
-    binary_matrix = []
-    total_annotations = 0
-    for review_idx, options_dict in annotator_data.items():
+def annotations_to_tensor(annotator_data):
+    """
+    Converts the annotations of one Summary_Annotations file into a dense count tensor.
+    
+    Parameters:
+        annotator_data (dict): review index -> subject -> label -> count.
+    
+    Returns:
+        counts (np.ndarray): A (reviews x SUBJECTS x LABELS) integer array of the number
+                             of annotators giving each label, in file order.
+        present (np.ndarray): A (reviews x SUBJECTS) boolean array marking the
+                              subjects each review has an entry for.
+    
+    Raises ValueError for a subject not in SUBJECTS or a label not in LABELS.
+    """
+    counts = np.zeros((len(annotator_data), len(SUBJECTS), len(LABELS)), dtype=np.int64)
+    present = np.zeros((len(annotator_data), len(SUBJECTS)), dtype=bool)
+    for review_pos, (review_idx, options_dict) in enumerate(annotator_data.items()):
         for subject, cat_dict in options_dict.items():
-            if subject not in ["OVERALL", "Clarity of Sentiment"]:
-                count_na = cat_dict.get("n/a", 0)
-                count_ordinal = sum(cat_dict[label] for label in ['1','2','3','4','5'])
-                total_annotations += 1
-                if (count_na + count_ordinal) == 3: # Ensure exactly three annotations per row
-                    binary_matrix.append([count_na, count_ordinal])
-    return np.array(binary_matrix), total_annotations
+            if subject not in SUBJECT_INDEX:
+                raise ValueError(f"Unknown annotation subject '{subject}' for review_idx {review_idx}")
+            for label in cat_dict:
+                if label not in LABELS:
+                    raise ValueError(f"Unknown label '{label}' for review_idx {review_idx}, subject '{subject}'")
+            subject_idx = SUBJECT_INDEX[subject]
+            present[review_pos, subject_idx] = True
+            counts[review_pos, subject_idx] = [cat_dict.get(label, 0) for label in LABELS]
+    return counts, present
+
+
+def extract_tensor_columns(file_path, columns):
+    """
+    Feature cache extractor: the count tensor and presence mask of one
+    Summary_Annotations file.
+    """
+    with open(file_path, 'r') as f:
+        annotator_data = json.load(f)
+    counts, present = annotations_to_tensor(annotator_data)
+    return {"counts": counts, "present": present}
+
+
+def load_count_tensor(file_path, cache_dir=None):
+    """
+    Returns (counts, present) of annotations_to_tensor for one Summary_Annotations
+    file. If cache_dir is given they are read memory-mapped from the feature cache.
+    """
+    if cache_dir is None:
+        tensor = extract_tensor_columns(file_path, ["counts", "present"])
+    else:
+        tensor = load_columns(file_path, ["counts", "present"], extract_tensor_columns, "s5_count_tensor", cache_dir)
+    return tensor["counts"], tensor["present"]
+
+
+def load_count_tensors(directory, cache_dir=None):
+    """
+    Yields (file_name, counts, present) for every Summary_Annotations file in directory.
+    """
+    for file_name in os.listdir(directory):
+        counts, present = load_count_tensor(os.path.join(directory, file_name), cache_dir)
+        yield file_name, counts, present
+
+
+def binary_matrix_from_tensor(counts, present):
+    """
+    Returns the (items x 2) [n/a, ordinal] count matrix of the binary subjects rated by
+    exactly three annotators, and the number of binary subject annotations.
+    """
+    subject_counts = counts[:, BINARY_SUBJECTS]
+    subject_present = present[:, BINARY_SUBJECTS]
+    count_na = subject_counts[..., 5]
+    count_ordinal = subject_counts[..., :5].sum(axis=-1)
+    total_annotations = int(subject_present.sum())
+    # Ensure exactly three annotations per row
+    keep = subject_present & (count_na + count_ordinal == 3)
+    return np.column_stack([count_na[keep], count_ordinal[keep]]), total_annotations
+
+
+def ordinal_matrix_from_tensor(counts, present):
+    """
+    Returns the (items x 5) ordinal count matrix of the ordinal subjects rated on the
+    scale by exactly three annotators, and the number of ordinal subject annotations
+    without any n/a.
+    """
+    subject_counts = counts[:, ORDINAL_SUBJECTS]
+    subject_present = present[:, ORDINAL_SUBJECTS]
+    count_na = subject_counts[..., 5]
+    count_ordinal = subject_counts[..., :5].sum(axis=-1)
+    total_annotations = int((subject_present & (count_ordinal > 0) & (count_na == 0)).sum())
+    # Ensure exactly three annotations per row
+    keep = subject_present & (count_ordinal == 3)
+    return subject_counts[keep][:, :5], total_annotations
+
+
+def prepare_binary_matrix(annotator_data):
+    return binary_matrix_from_tensor(*annotations_to_tensor(annotator_data))
 
 
 def prepare_ordinal_matrix(annotator_data):
-    ordinal_matrix = []
-    total_annotations = 0
-    for review_idx, options_dict in annotator_data.items():
-        for subject, cat_dict in options_dict.items():
-            if subject != "OVERALL":
-                count_na = cat_dict.get("n/a", 0)
-                count_ordinal = sum(cat_dict[label] for label in ['1','2','3','4','5'])
-                if count_ordinal > 0 and count_na == 0:
-                    total_annotations += 1
-                if count_ordinal == 3: # Ensure exactly three annotations per row
-                    ordinal_matrix.append([cat_dict[label] for label in ['1','2','3','4','5']])
-    return np.array(ordinal_matrix), total_annotations
+    return ordinal_matrix_from_tensor(*annotations_to_tensor(annotator_data))
+
+
+def weighted_kappa_from_confusion(confusion):
+    """
+    Computes the quadratic weighted Cohen's kappa of each confusion matrix in a stack.
+    
+    Parameters:
+        confusion (np.ndarray): A 3D array (pairs x labels x labels) where entry
+                                [p, i, j] counts the items given label i by the
+                                first and label j by the second rater of pair p.
+    
+    Returns:
+        kappas (np.ndarray): One kappa per pair, as sklearn's cohen_kappa_score
+                             with weights='quadratic' gives for the same labels:
+                             the weights are the squared differences between the
+                             positions of the labels used by either rater.
+                             NaN where kappa is undefined.
+    """
+    confusion = np.asarray(confusion, dtype=float)
+    sum0 = confusion.sum(axis=1)
+    sum1 = confusion.sum(axis=2)
+    
+    # Labels neither rater used are left out of the positions, as in sklearn
+    present = (sum0 + sum1) > 0
+    positions = np.cumsum(present, axis=1) - 1
+    weights = (positions[:, :, None] - positions[:, None, :]) ** 2
+    
+    totals = sum0.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = sum0[:, :, None] * sum1[:, None, :] / totals[:, None, None]
+        observed_disagreement = np.sum(weights * confusion, axis=(1, 2))
+        expected_disagreement = np.sum(weights * expected, axis=(1, 2))
+        kappas = 1 - observed_disagreement / expected_disagreement
+    return np.where((totals == 0) | (expected_disagreement == 0), np.nan, kappas)
+
+
+def pairwise_confusion(counts, groups=None, n_groups=1):
+    """
+    Returns the (n_groups x 3 x 5 x 5) confusion matrices of the three rater pairs
+    for (items x 5) ordinal count rows with three annotations each, where groups
+    gives each row's group (all rows are in group 0 by default).
+    """
+    groups = np.zeros(len(counts), dtype=np.int64) if groups is None else groups
+    
+    # Each item's labels in ascending order: the k-th rater is given the (k+1)-th smallest
+    # label, i.e. the number of labels whose cumulative count does not exceed k
+    cumulative = np.cumsum(counts, axis=1)
+    labels = [np.sum(cumulative <= k, axis=1) for k in range(3)]
+    
+    confusion = np.zeros((n_groups, 3, 5, 5))
+    for pair_idx, (annotator_a, annotator_b) in enumerate(combinations(range(3), 2)):
+        cells = groups * 25 + labels[annotator_a] * 5 + labels[annotator_b]
+        confusion[:, pair_idx] = np.bincount(cells, minlength=n_groups * 25).reshape(n_groups, 5, 5)
+    return confusion
+
+
+def coincidence_matrix(counts, groups=None, n_groups=1):
+    """
+    Computes Krippendorff's coincidence matrices of ordinal count rows.
+    
+    Parameters:
+        counts (np.ndarray): An (items x 5) array of the number of raters giving each
+                             ordinal label to an item, with any number of raters;
+                             items with fewer than two ratings are not pairable.
+        groups (np.ndarray): Each row's group (all rows are in group 0 by default).
+    
+    Returns:
+        coincidence (np.ndarray): An (n_groups x 5 x 5) array, where entry [g, c, k] sums
+                                  n_uc * (n_uk - [c == k]) / (m_u - 1) over the items
+                                  u of group g with m_u ratings.
+    """
+    counts = np.asarray(counts, dtype=float).reshape(-1, 5)
+    groups = np.zeros(len(counts), dtype=np.int64) if groups is None else np.asarray(groups)
+    n_ratings = counts.sum(axis=1)
+    pairable = n_ratings >= 2
+    counts = counts[pairable]
+    groups = groups[pairable]
+    weighted = counts / (n_ratings[pairable] - 1)[:, None]
+    
+    coincidence = np.zeros((n_groups, 5, 5))
+    for c in range(5):
+        for k in range(5):
+            values = weighted[:, c] * (counts[:, k] - (c == k))
+            coincidence[:, c, k] = np.bincount(groups, weights=values, minlength=n_groups)
+    return coincidence
+
+
+def ordinal_alpha_from_coincidence(coincidence):
+    """
+    Computes Krippendorff's alpha with the ordinal metric from coincidence matrices
+    of any leading shape (... x 5 x 5). Returns NaN where alpha is undefined (fewer
+    than two pairable values, or no variation between them).
+    """
+    n_c = coincidence.sum(axis=-1)
+    n = n_c.sum(axis=-1)
+    
+    # Ordinal metric: delta_ck = (sum of n_g for g from c to k - (n_c + n_k) / 2) ** 2
+    cumulative = np.cumsum(n_c, axis=-1)
+    between = cumulative[..., None, :] - cumulative[..., :, None] + n_c[..., :, None]
+    delta = (between - (n_c[..., :, None] + n_c[..., None, :]) / 2) ** 2
+    upper = np.arange(5)[None, :] >= np.arange(5)[:, None]
+    delta = np.where(upper, delta, np.swapaxes(delta, -1, -2))
+    
+    observed = np.sum(coincidence * delta, axis=(-2, -1))
+    expected = np.sum(n_c[..., :, None] * n_c[..., None, :] * delta, axis=(-2, -1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alpha = 1 - (n - 1) * observed / expected
+    return np.where(expected > 0, alpha, np.nan)
 
 
 def calculate_weighted_kappa(ordinal_matrices):
-    expanded_annotations = []
-    for counts in ordinal_matrices:
-        labels = []
-        for idx, count in enumerate(counts):
-            labels.extend([idx + 1] * count)
-        if len(labels) == 3:
-            expanded_annotations.append(labels)
+    counts = np.asarray(ordinal_matrices, dtype=np.int64).reshape(-1, 5)
+    counts = counts[counts.sum(axis=1) == 3]
+    return np.mean(weighted_kappa_from_confusion(pairwise_confusion(counts)[0]))
+
+
+def agreement_statistics(counts, present):
+    """
+    Computes additive agreement statistics for every subject of one count tensor, so
+    that any grouping of subjects and files is obtained by summing them.
+    
+    Returns a dict of arrays with a leading SUBJECTS axis:
+        binary_items, ordinal_items: rows kept (exactly three annotations).
+        binary_total, ordinal_total: annotations counted as in the matrix functions.
+        binary_totals, ordinal_totals: per-category sums of the kept rows.
+        binary_observed, ordinal_observed: sums of the per-row observed agreement.
+        confusion: the (3 x 5 x 5) rater pair confusion matrices of the ordinal rows.
+        alpha_items: items with at least two ordinal ratings, whatever their number
+                     of raters (n/a counts as a missing rating).
+        coincidence: the (5 x 5) coincidence matrices of those items.
+    """
+    n_subjects = len(SUBJECTS)
+    subject_ids = np.broadcast_to(np.arange(n_subjects), present.shape)
+    count_na = counts[..., 5]
+    count_ordinal = counts[..., :5].sum(axis=-1)
+    stats = {}
+    
+    for name, subject_mask, keep, total, columns in [
+        ("binary", BINARY_SUBJECTS, count_na + count_ordinal == 3, present, 
+         np.stack([count_na, count_ordinal], axis=-1)),
+        ("ordinal", ORDINAL_SUBJECTS, count_ordinal == 3, present & (count_ordinal > 0) & (count_na == 0), 
+         counts[..., :5])
+    ]:
+        keep = keep & present & subject_mask
+        rows = columns[keep]
+        groups = subject_ids[keep]
+        observed = (np.sum(rows ** 2, axis=1) - 3) / 6
+        stats[f"{name}_items"] = np.bincount(groups, minlength=n_subjects)
+        stats[f"{name}_total"] = (total & subject_mask).sum(axis=0)
+        stats[f"{name}_totals"] = np.stack([np.bincount(groups, weights=rows[:, idx], minlength=n_subjects) 
+                                            for idx in range(rows.shape[1])], axis=1)
+        stats[f"{name}_observed"] = np.bincount(groups, weights=observed, minlength=n_subjects)
+        if name == "ordinal":
+            stats["confusion"] = pairwise_confusion(rows, groups, n_subjects)
+    
+    pairable = present & ORDINAL_SUBJECTS & (count_ordinal >= 2)
+    stats["alpha_items"] = pairable.sum(axis=0)
+    stats["coincidence"] = coincidence_matrix(counts[..., :5][pairable], subject_ids[pairable], n_subjects)
+    return stats
+
+
+def kappas_from_statistics(stats):
+    """
+    Given agreement statistics (see agreement_statistics) with any leading shape,
+    returns a dict of arrays of that shape: the binary and ordinal Fleiss' kappa with
+    their observed and expected agreement, the weighted kappa and (given coincidence
+    matrices) the ordinal Krippendorff's alpha. NaN where a group has no rows or a
+    statistic is undefined.
+    """
+    results = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name in ["binary", "ordinal"]:
+            items = stats[f"{name}_items"]
+            p = stats[f"{name}_totals"] / (items * 3)[..., None]
+            observed = stats[f"{name}_observed"] / items
+            expected = np.sum(p ** 2, axis=-1)
+            results[f"{name}_kappa"] = (observed - expected) / (1 - expected)
+            results[f"{name}_observed"] = observed
+            results[f"{name}_expected"] = expected
+    confusion = stats["confusion"]
+    pair_kappas = weighted_kappa_from_confusion(confusion.reshape(-1, 5, 5)).reshape(confusion.shape[:-2])
+    results["weighted_kappa"] = np.mean(pair_kappas, axis=-1)
+    if "coincidence" in stats:
+        results["ordinal_alpha"] = ordinal_alpha_from_coincidence(stats["coincidence"])
+    return results
+
+
+def row_patterns(matrix):
+    """
+    Returns the distinct rows of an (items x categories) count matrix and how many
+    items have each of them. With three annotators there are only a few dozen.
+    """
+    matrix = np.asarray(matrix, dtype=np.int64)
+    if len(matrix) == 0:
+        return matrix, np.zeros(0, dtype=np.int64)
+    return np.unique(matrix, axis=0, return_counts=True)
+
 
-    pairwise_kappas = []
-    for annotator_a, annotator_b in combinations(range(3), 2):
-        labels_a = [annotation[annotator_a] for annotation in expanded_annotations]
-        labels_b = [annotation[annotator_b] for annotation in expanded_annotations]
-        pairwise_kappas.append(cohen_kappa_score(labels_a, labels_b, weights='quadratic'))
+def bootstrap_block(binary_patterns, ordinal_patterns, n_resamples, seed):
+    """
+    Draws n_resamples item-level bootstrap resamples of the binary and ordinal
+    matrices (given as row_patterns) with seed, and returns their binary Fleiss',
+    ordinal Fleiss' and weighted kappas as arrays of length n_resamples.
+    """
+    rng = np.random.default_rng(seed)
+    stats = {}
+    for name, (rows, frequencies) in [("binary", binary_patterns), ("ordinal", ordinal_patterns)]:
+        n_items = int(frequencies.sum())
+        # Resampling n_items items with replacement only decides how many times each
+        # distinct row is drawn, which is one multinomial draw over the row patterns
+        if n_items > 0:
+            draws = rng.multinomial(n_items, frequencies / n_items, size=n_resamples)
+        else:
+            draws = np.zeros((n_resamples, 0), dtype=np.int64)
+        stats[f"{name}_items"] = draws.sum(axis=1)
+        stats[f"{name}_totals"] = draws @ rows
+        stats[f"{name}_observed"] = draws @ ((np.sum(rows ** 2, axis=1) - 3) / 6)
+        if name == "ordinal":
+            confusion = pairwise_confusion(rows, np.arange(len(rows)), len(rows))
+            stats["confusion"] = (draws @ confusion.reshape(len(rows), -1)).reshape(n_resamples, 3, 5, 5)
+    kappas = kappas_from_statistics(stats)
+    return {name: kappas[name] for name in ["binary_kappa", "ordinal_kappa", "weighted_kappa"]}
+
+
+def bootstrap_kappas(binary_matrix, ordinal_matrix, n_resamples=1000, confidence=0.95, seed=0, workers=1, 
+                     block_size=1000):
+    """
+    Computes percentile bootstrap confidence intervals, resampling items, for the
+    binary Fleiss' kappa, the ordinal Fleiss' kappa and the weighted kappa.
+    
+    Resamples are drawn in blocks of block_size, and block i always uses the i-th
+    np.random.SeedSequence child of seed. Running the blocks in parallel therefore
+    gives the same intervals as running them one after another.
+    
+    Returns:
+        intervals (dict): "binary_kappa", "ordinal_kappa" and "weighted_kappa" ->
+                          (low, high), or (None, None) if undefined.
+    """
+    binary_patterns = row_patterns(np.reshape(binary_matrix, (-1, 2)))
+    ordinal_patterns = row_patterns(np.reshape(ordinal_matrix, (-1, 5)))
+    block_sizes = [block_size] * (n_resamples // block_size)
+    if n_resamples % block_size:
+        block_sizes.append(n_resamples % block_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(block_sizes))
+    
+    if workers > 1 and len(block_sizes) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(block_sizes))) as executor:
+            blocks = list(executor.map(bootstrap_block, [binary_patterns] * len(block_sizes), 
+                                       [ordinal_patterns] * len(block_sizes), block_sizes, seeds))
+    else:
+        blocks = [bootstrap_block(binary_patterns, ordinal_patterns, size, block_seed) 
+                  for size, block_seed in zip(block_sizes, seeds)]
+    
+    alpha = (1 - confidence) / 2
+    intervals = {}
+    for name in ["binary_kappa", "ordinal_kappa", "weighted_kappa"]:
+        values = np.concatenate([block[name] for block in blocks]) if blocks else np.zeros(0)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            intervals[name] = (None, None)
+        else:
+            low, high = np.quantile(values, [alpha, 1 - alpha])
+            intervals[name] = (float(low), float(high))
+    return intervals
+
+
+def sum_statistics(stats, axis):
+    return {name: values.sum(axis=axis) for name, values in stats.items()}
 
-    return np.mean(pairwise_kappas)
+
+def save_breakdown(breakdown, output_dir):
+    """
+    Writes the agreement breakdown rows (dicts with scope, category and subject plus
+    the statistics of kappas_from_statistics and the item counts) to
+    agreement_breakdown.csv in output_dir.
+    """
+    output_path = os.path.join(output_dir, "agreement_breakdown.csv")
+    fieldnames = ["scope", "category", "subject",
+                  "binary_items", "binary_total", "binary_kappa", "binary_observed", "binary_expected",
+                  "ordinal_items", "ordinal_total", "ordinal_kappa", "ordinal_observed", "ordinal_expected",
+                  "weighted_kappa", "alpha_items", "ordinal_alpha"]
+    try:
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in breakdown:
+                writer.writerow({key: ("" if isinstance(value, float) and np.isnan(value) else 
+                                       f"{value:.6f}" if isinstance(value, float) else value)
+                                 for key, value in row.items()})
+        print(f"Agreement breakdown saved to: {output_path}")
+    except IOError:
+        print(f"Failed to write agreement breakdown to: {output_path}")
+
+
+def agreement_breakdown(file_statistics):
+    """
+    Given a dict mapping category names to the agreement statistics of their files,
+    returns the breakdown rows by subject within each category, by subject over
+    all categories, by category over all subjects, and overall.
+    """
+    categories = list(file_statistics)
+    stats = {name: np.stack([file_statistics[category][name] for category in categories]) 
+             for name in file_statistics[categories[0]]}
+    subjects = [(idx, subject) for idx, subject in enumerate(SUBJECTS) if ORDINAL_SUBJECTS[idx]]
+    
+    scopes = [
+        ("subject_category", stats, [(c, categories[c], s, subject) for c in range(len(categories)) 
+                                     for s, subject in subjects]),
+        ("subject", sum_statistics(stats, 0), [(None, "all", s, subject) for s, subject in subjects]),
+        ("category", sum_statistics(stats, 1), [(c, category, None, "all") for c, category in enumerate(categories)]),
+        ("overall", sum_statistics(sum_statistics(stats, 0), 0), [(None, "all", None, "all")])
+    ]
+    
+    breakdown = []
+    for scope, scope_stats, keys in scopes:
+        kappas = kappas_from_statistics(scope_stats)
+        for category_idx, category, subject_idx, subject in keys:
+            index = tuple(idx for idx in (category_idx, subject_idx) if idx is not None)
+            row = {"scope": scope, "category": category, "subject": subject}
+            for name in ["binary", "ordinal"]:
+                row[f"{name}_items"] = int(scope_stats[f"{name}_items"][index])
+                row[f"{name}_total"] = int(scope_stats[f"{name}_total"][index])
+                for statistic in ["kappa", "observed", "expected"]:
+                    row[f"{name}_{statistic}"] = float(kappas[f"{name}_{statistic}"][index])
+            row["weighted_kappa"] = float(kappas["weighted_kappa"][index])
+            row["alpha_items"] = int(scope_stats["alpha_items"][index])
+            row["ordinal_alpha"] = float(kappas["ordinal_alpha"][index])
+            breakdown.append(row)
+    return breakdown
 
 
-def main():
+def main(cache_dir=None, output_dir=None, n_resamples=0, workers=1, seed=0):
     analysis_dir = 'Summary_Annotations'
-    annotations = load_annotations(analysis_dir)
 
+    file_statistics = {}
+    coincidence = np.zeros((5, 5))
+    alpha_items = 0
     binary_matrices = []
     ordinal_matrices = []
     total_binary_annotations = 0
     total_ordinal_annotations = 0
 
-    for file_name, annotator_data in annotations.items():
-        binary_matrix, binary_annotations = prepare_binary_matrix(annotator_data)
-        ordinal_matrix, ordinal_annotations = prepare_ordinal_matrix(annotator_data)
+    # Each file is converted once into a count tensor, from which both matrices are sliced
+    for file_name, counts, present in load_count_tensors(analysis_dir, cache_dir):
+        binary_matrix, binary_annotations = binary_matrix_from_tensor(counts, present)
+        ordinal_matrix, ordinal_annotations = ordinal_matrix_from_tensor(counts, present)
+        if output_dir is not None:
+            file_statistics[os.path.splitext(file_name)[0]] = agreement_statistics(counts, present)
+
+        # Every ordinal item with two or more ratings counts towards alpha, however many raters it has
+        pairable = present & ORDINAL_SUBJECTS & (counts[..., :5].sum(axis=-1) >= 2)
+        coincidence += coincidence_matrix(counts[..., :5][pairable])[0]
+        alpha_items += int(pairable.sum())
 
         total_binary_annotations += binary_annotations
         total_ordinal_annotations += ordinal_annotations
@@ -135,7 +547,7 @@ def main():
         if binary_matrix.size > 0:
             binary_matrices.append(binary_matrix)
         if len(ordinal_matrix) > 0:
-            ordinal_matrices.extend(ordinal_matrix)
+            ordinal_matrices.append(ordinal_matrix)
 
     print("Step 1: Binary Agreement (n/a vs Ordinal)")
     if binary_matrices:
@@ -160,7 +572,7 @@ def main():
         num_rows, num_columns = ordinal_full_matrix.shape
         proportion_ordinal = num_rows / total_ordinal_annotations
         ordinal_fleiss_kappa, actual_agreement, expected_agreement = fleiss_kappa_components(ordinal_full_matrix)
-        weighted_kappa_score = calculate_weighted_kappa(ordinal_matrices)
+        weighted_kappa_score = calculate_weighted_kappa(ordinal_full_matrix)
         print(f"Total Ordinal Annotations: {total_ordinal_annotations}")
         print(f"Filtered Ordinal Annotations: {num_rows}")
         print(f"Proportion Included: {proportion_ordinal:.4f}")
@@ -171,6 +583,31 @@ def main():
     else:
         print("No valid ordinal annotations found for weighted kappa calculation.\n")
 
+    print("Step 3: Ordinal Agreement over All Items (Krippendorff's Alpha)")
+    if alpha_items > 0:
+        print(f"Items with Two or More Ratings: {alpha_items}")
+        print(f"Krippendorff's Alpha (ordinal): {ordinal_alpha_from_coincidence(coincidence):.4f}\n")
+    else:
+        print("No items with two or more ordinal ratings for Krippendorff's alpha.\n")
+
+    # Bootstrap confidence intervals for the three kappas (n_resamples = 0 to skip)
+    if n_resamples > 0 and (binary_matrices or ordinal_matrices):
+        binary_full_matrix = np.vstack(binary_matrices) if binary_matrices else np.zeros((0, 2), dtype=np.int64)
+        ordinal_full_matrix = np.vstack(ordinal_matrices) if ordinal_matrices else np.zeros((0, 5), dtype=np.int64)
+        intervals = bootstrap_kappas(binary_full_matrix, ordinal_full_matrix, n_resamples, seed=seed, 
+                                     workers=workers)
+        print(f"Step 4: Bootstrap 95% Confidence Intervals ({n_resamples} resamples)")
+        print(f"Fleiss' Kappa (binary): {format_interval(intervals['binary_kappa'])}")
+        print(f"Fleiss' Kappa (ordinal): {format_interval(intervals['ordinal_kappa'])}")
+        print(f"Weighted Kappa: {format_interval(intervals['weighted_kappa'])}\n")
+
+    # Agreement by subject and by product category (one file per category)
+    if output_dir is not None and file_statistics:
+        save_breakdown(agreement_breakdown(file_statistics), output_dir)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Reuse the per-file count tensors cached by earlier runs, write the per-subject
+    # and per-category breakdown to the Analysis directory, and bootstrap the kappas
+    # over all cores
+    main(cache_dir=CACHE_DIR, output_dir="Analysis", n_resamples=10000, workers=os.cpu_count() or 1)
\ No newline at end of file
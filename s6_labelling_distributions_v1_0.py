@@ -7,55 +7,95 @@ This script processes the annotator outputs and plots the related distributions
 across the product categories.
 
 Change log:
-v1_0 = Functional code.
+v1_0 = Functional code. Counts held in a (files x subjects x categories) array, with
+    per-category and pooled distributions saved as CSV and NPZ.
 """
 
-import json
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from itertools import repeat
+import numpy as np
 import os
+from feature_cache import CACHE_DIR
+from s5_annotator_agreement_v2_2 import LABELS, SUBJECTS, load_count_tensor
 
 
-def main():
+def count_file(file_path, cache_dir=None):
+    """
+    Returns the (subjects x categories) annotation counts of one Summary_Annotations
+    file, summed over its reviews from the s5 count tensor.
+    """
+    try:
+        counts, _ = load_count_tensor(file_path, cache_dir)
+    except ValueError as e:
+        raise ValueError(f"{e} in file {os.path.basename(file_path)}") from e
+    return np.asarray(counts).sum(axis=0)
+
+
+def count_distributions(analysis_dir, cache_dir=None, workers=1):
+    """
+    Counts the annotations of every file in analysis_dir, file by file (in a process
+    pool if workers > 1). Returns the file names and the (files x subjects x
+    categories) integer count array, ordered as SUBJECTS and LABELS.
+    """
+    file_names = os.listdir(analysis_dir)
+    file_paths = [os.path.join(analysis_dir, file_name) for file_name in file_names]
+    distributions = np.zeros((len(file_names), len(SUBJECTS), len(LABELS)), dtype=np.int64)
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for file_idx, file_counts in enumerate(executor.map(count_file, file_paths, repeat(cache_dir))):
+                distributions[file_idx] = file_counts
+    else:
+        for file_idx, file_path in enumerate(file_paths):
+            distributions[file_idx] = count_file(file_path, cache_dir)
+    return file_names, distributions
+
+
+def save_distributions(file_names, distributions, output_dir):
+    """
+    Writes the per-category and pooled distributions to labelling_distributions.csv
+    (one row per category and subject, category "all" for the pooled rows) and to
+    labelling_distributions.npz (the count array with its axis labels).
+    """
+    categories = [os.path.splitext(file_name)[0] for file_name in file_names]
+    npz_path = os.path.join(output_dir, "labelling_distributions.npz")
+    np.savez(npz_path, counts=distributions, categories=np.array(categories),
+             subjects=np.array(SUBJECTS), labels=np.array(LABELS))
+    print(f"Distributions saved to: {npz_path}")
+
+    csv_path = os.path.join(output_dir, "labelling_distributions.csv")
+    scopes = list(zip(categories, distributions)) + [("all", distributions.sum(axis=0))]
+    try:
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["category", "subject"] + LABELS)
+            for category, counts in scopes:
+                for subject, subject_counts in zip(SUBJECTS, counts.tolist()):
+                    writer.writerow([category, subject] + subject_counts)
+        print(f"Distributions saved to: {csv_path}")
+    except IOError:
+        print(f"Failed to write distributions to: {csv_path}")
+
+
+def main(cache_dir=None, workers=1, output_dir=None):
     # Load and process the JSON data
     analysis_dir = 'Summary_Annotations'
-    init_vals = {"1":0, "2":0, "3":0, "4":0, "5":0, "n/a":0}
-    subjects = {
-              "Feature Usage": init_vals.copy(),
-              "Interaction Time": init_vals.copy(),
-              "Context Experience": init_vals.copy(),
-              "Efficiency": init_vals.copy(),
-              "Excellence": init_vals.copy(),
-              "Status": init_vals.copy(),
-              "Esteem": init_vals.copy(),
-              "Play": init_vals.copy(),
-              "Aesthetics": init_vals.copy(),
-              "Ethics": init_vals.copy(),
-              "Spirituality": init_vals.copy(),
-              "OVERALL": init_vals.copy(),
-              "Clarity of Sentiment": init_vals.copy()
-              }
-    
-    for file_name in os.listdir(analysis_dir):
-        with open(os.path.join(analysis_dir, file_name), 'r') as f:
-            annotator_data = json.load(f)
-        for review_idx, options_dict in annotator_data.items():
-            for option, cat_dict in options_dict.items():
-                if option not in subjects.keys():
-                    raise ValueError(f"Option {option} for file {file_name}, review_idx {review_idx}, \
-                          not represented in pre-defined subjects nested dictionary!")
-                else:
-                    for category, cat_val in cat_dict.items():
-                        if category not in subjects[option].keys():
-                            raise ValueError(f"Category {category} for file {file_name}, review_idx {review_idx}, \
-                                  option {option} not represented in pre-defined subjects nested dictionary!")
-                        else:
-                            subjects[option][category] += cat_val
+    file_names, distributions = count_distributions(analysis_dir, cache_dir, workers)
+    pooled = distributions.sum(axis=0)
 
+    subjects = {subject: dict(zip(LABELS, subject_counts)) 
+                for subject, subject_counts in zip(SUBJECTS, pooled.tolist())}
     for subject, category_dict in subjects.items():
         print("Subject is:", subject)
         print(category_dict, '\n')
-    
-    return
+
+    if output_dir is not None:
+        save_distributions(file_names, distributions, output_dir)
+
+    return file_names, distributions, pooled
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Reuse the count tensors cached by s5, and save the distributions for plotting
+    main(cache_dir=CACHE_DIR, workers=os.cpu_count() or 1, output_dir="Analysis")
\ No newline at end of file